@@ -4,11 +4,69 @@ The aim of this module is to provide all the tools needed to adapt a given archi
 into one that provides all the good parameters and organ name definition.
 
 """
+import weakref
 
 def get_leaves(g, label='LeafElement'):
     labels = g.property('label')
     return [k for k,l in labels.iteritems() if l.startswith(label)]
 
+# Leaf elements of blades, by (id(g), label, with_geometry)
+_blade_leaves_cache = {}
+
+def get_blade_leaves(g, label='LeafElement', with_geometry=True):
+    """ Get the leaf elements of each blade of the MTG.
+    
+    The decomposition is cached. Checking the cache costs O(1): it is only 
+    computed again when g is another MTG or when the number of labels or of 
+    geometries of g changes (e.g. new leaf elements). Code that changes the 
+    geometries of g while keeping their number must call 
+    'clear_blade_leaves_cache' (see 'grow_canopy' in simulation_tools).
+    
+    Parameters
+    ----------
+    g: MTG
+        MTG representing the canopy
+    label: str
+        Label of the leaf elements to keep in blades
+    with_geometry: bool
+        True if only leaf elements with a geometry must be kept
+        
+    Returns
+    -------
+    blade_leaves: tuple((blade, (leaf elements)))
+        Ids of leaf elements in each blade of the MTG, in topological order
+    """
+    labels = g.property('label')
+    geom = g.property('geometry')
+    key = (id(g), label, with_geometry)
+    fingerprint = (len(labels), len(geom))
+    cached = _blade_leaves_cache.get(key)
+    # The id of a deleted MTG can be reused by a new one: check identity
+    if cached is None or cached[0]() is not g or cached[1] != fingerprint:
+        if len(_blade_leaves_cache) > 100:
+            _blade_leaves_cache.clear()
+        blade_leaves = []
+        nb_chars = len(label)
+        for blade, lab in labels.iteritems():
+            if lab[:5]=='blade':
+                leaf = tuple(vid for vid in g.components(blade) 
+                             if labels[vid][:nb_chars]==label and 
+                             (not with_geometry or vid in geom))
+                blade_leaves.append((blade, leaf))
+        cached = (weakref.ref(g), fingerprint, tuple(blade_leaves))
+        _blade_leaves_cache[key] = cached
+    return cached[2]
+
+def clear_blade_leaves_cache(g=None):
+    """ Forget the decomposition of blades cached by 'get_blade_leaves' for g, 
+        or for all MTGs if g is None.
+    """
+    if g is None:
+        _blade_leaves_cache.clear()
+    else:
+        for key in [k for k in _blade_leaves_cache if k[0]==id(g)]:
+            del _blade_leaves_cache[key]
+
 def get_total_leaf_area(g, label='LeafElement'):
     leaves = get_leaves(g)
     return sum(g.node(leaf).area for leaf in leaves)
@@ -116,6 +116,8 @@ class BrownRustDU(DispersalUnit):
                     return
 
 # Lesion ###########################################################################################
+_delta_thermal_time_cache = {}
+
 class BrownRustLesion(Lesion):
     """ Define a lesion of brown rust """
     def __init__(self, mutable = False):
@@ -189,9 +191,21 @@ class BrownRustLesion(Lesion):
             return 0.
 
     def delta_thermal_time_growth(self, leaf_temperature = [0.]):
-        """ Calculate progress in effective temperature for growth process """
+        """ Calculate progress in effective temperature for growth process 
+        
+            All lesions of the canopy receive the same temperature sequence
+            during a time step, so the result is cached by sequence.
+        """
         if len(leaf_temperature) > 0.:
-            return sum([max(0, self.get_effective_temp(temp))*1/24. for temp in leaf_temperature])
+            f = self.fungus
+            key = (f.temp_min_chlo, f.temp_opt_chlo, f.temp_max_chlo, 
+                   tuple(leaf_temperature))
+            if key not in _delta_thermal_time_cache:
+                if len(_delta_thermal_time_cache) > 1000:
+                    _delta_thermal_time_cache.clear()
+                _delta_thermal_time_cache[key] = sum([max(0, self.get_effective_temp(temp))*1/24. 
+                                                      for temp in leaf_temperature])
+            return _delta_thermal_time_cache[key]
         else:
             return 0.
 
@@ -292,7 +306,7 @@ class BrownRustLesion(Lesion):
             self.become_senescent()
         if not self.senescence_response_completed:
             # Get ratio of lesions senesced in cohort, if individual lesion ratio_sen = 1
-            nb_sen = len(filter(lambda x: x[0]<=senesced_length, self.position))
+            nb_sen = sum(1 for x in self.position if x[0]<=senesced_length)
             nb_new_sen = nb_sen - self.nb_lesions_sen
             ratio_sen = float(nb_new_sen)/(self.nb_lesions_non_sen)
 
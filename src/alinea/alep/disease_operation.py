@@ -6,6 +6,7 @@ fungal objects on the MTG.
 """
 
 import random as rd
+from copy import deepcopy
 from alinea.adel.mtg_interpreter import *
 from openalea.plantgl.all import *
 
@@ -29,11 +30,17 @@ def generate_stock_du(nb_dus, disease, **kwds):
     Returns
     -------
     dus: list of objects
-        List of dispersal units of the given disease
+        List of dispersal units of the given disease. If the disease
+        operates with cohorts ('group_dus' is True), the list holds a single
+        cohort of 'nb_dus' dispersal units.
     """
-    DU = disease.dispersal_unit(**kwds)
-    return [DU(nb_spores=rd.randint(1,100), status='emitted')
-                        for i in range(nb_dus)]
+    if nb_dus < 1:
+        return []
+    if getattr(disease, 'group_dus', False) is True:
+        du = disease.dispersal_unit(**kwds)
+        du.set_nb_dispersal_units(nb_dus)
+        return [du]
+    return disease.dispersal_units(nb_dus, **kwds)
 
 class DU_Generator(object):
     """ Generator of DU to be used in the form of SoilInoculum in septo3D."""
@@ -43,9 +50,9 @@ class DU_Generator(object):
         self.kwds = kwds
         
     def create_stock(self, nb_dus):
-        return [self.disease.dispersal_unit(group_dus=self.group_dus, **self.kwds) for i in range(int(nb_dus))]
+        return self.disease.dispersal_units(int(nb_dus), group_dus=self.group_dus, **self.kwds)
                         
-def generate_stock_lesions(nb_lesions, disease, position=None):
+def generate_stock_lesions(nb_lesions, disease, position=None, **kwds):
     """ Generate a stock of lesions.
     
     Parameters
@@ -54,14 +61,21 @@ def generate_stock_lesions(nb_lesions, disease, position=None):
         Number of lesion to create in the stock
     disease: model
         Implementation for a model of fungal disease
+    position: list
+        Position of the lesions on the leaf
         
     Returns
     -------
     lesions: list of objects
         List of lesions of the given disease
     """
-    lesion = disease.lesion(**kwds)
-    return [lesion(nb_spores=rd.randint(1,100), position=position) for i in range(nb_lesions)]
+    lesions = [disease.lesion(**kwds) for i in range(nb_lesions)]
+    if position is not None:
+        for les in lesions:
+            les.set_position(deepcopy(position))
+    return lesions
+
+generate_stock_lesion = generate_stock_lesions
 
 def generate_lesions_with_emission(nb_lesions, nb_dus, disease):
     """ Generate a stock of lesions that are emitting dispersal units.
@@ -116,6 +130,20 @@ def override_method(LesionKlass, method=None):
     if method:
         LesionKlass.method = method
     
+_disease_plugins = {}
+_diseases = {}
+def load_disease(disease_model):
+    """ Load the disease model registered as plugin under the given name.
+    
+    Plugins are discovered only once (at first call), and each disease model
+    is loaded only once.
+    """
+    if disease_model not in _diseases:
+        if len(_disease_plugins)==0:
+            _disease_plugins.update(plugin.discover('alep.disease'))
+        _diseases[disease_model] = _disease_plugins[disease_model].load()
+    return _diseases[disease_model]
+
 def distribute_disease(g,
                        fungal_object='lesion', 
                        nb_objects=1, 
@@ -144,8 +172,7 @@ def distribute_disease(g,
         Updated MTG with dispersal units or lesions
     """
     # Create a pool of dispersal units (DU)
-    diseases = plugin.discover('alep.disease')
-    disease = diseases[disease_model].load()
+    disease = load_disease(disease_model)
     if fungal_object=='dispersal_unit':
         objects = generate_stock_du(nb_dus=nb_objects, disease=disease)
     elif fungal_object=='lesion':
@@ -3,6 +3,10 @@
 The aim of this module is to provide all the tools needed to compute
 the outputs of the disease models. 
 """
+import re
+import numpy as np
+
+from alinea.alep.architecture import get_leaves, set_property_on_each_id
 
 
 def count_lesions(g):
@@ -18,7 +22,7 @@ def count_lesions(g):
     nb_lesions: int
         Number of lesions on the MTG
     """
-    return len(sum(g.property('lesions').values(), []))
+    return sum(len(v) for v in g.property('lesions').values())
 
 def count_dispersal_units(g):
     """ Count dispersal units of the mtg.
@@ -33,7 +37,7 @@ def count_dispersal_units(g):
     nb_dispersal_units: int
         Number of dispersal units on the MTG
     """
-    return len(sum(g.property('dispersal_units').values(), []))
+    return sum(len(v) for v in g.property('dispersal_units').values())
     
 def count_lesions_by_leaf(g):
     """ Count lesions on each leaf of the MTG.
@@ -49,7 +53,26 @@ def count_lesions_by_leaf(g):
         Number of lesions on each part of the MTG given by the label
     """
     lesions = g.property('lesions')
-    return {k:len(v) for k,v in lesions.iteritems()}
+    return dict(zip(lesions.keys(), map(len, lesions.values())))
+
+def count_lesion_surfaces_by_leaf(g):
+    """ Sum the surface of lesions on each leaf of the MTG.
+
+    Lesions in cohort already carry the surface of all the lesions they
+    represent, so the sum is done in a single pass on lesion objects.
+
+    Parameters
+    ----------
+    g: MTG
+        MTG representing the canopy
+
+    Returns
+    -------
+    lesion_surfaces_by_leaf: dict([id:surface_lesions])
+        Surface of the lesions on each part of the MTG carrying lesions
+    """
+    lesions = g.property('lesions')
+    return {k:sum(l.surface for l in v) for k,v in lesions.items()}
 
 def count_dispersal_units_by_leaf(g, label='LeafElement'):
     """ Count dispersal units on each part of the MTG given by the label.
@@ -67,21 +90,26 @@ def count_dispersal_units_by_leaf(g, label='LeafElement'):
         Number of dispersal units on each part of the MTG given by the label
     """
     dispersal_units = g.property('dispersal_units')
-    return {k:len(v) for k,v in dispersal_units.iteritems()}
+    return dict(zip(dispersal_units.keys(), map(len, dispersal_units.values())))
+
+def _color_infected_vertices(g, fungal_property, 
+                             infected_color=(180, 0, 0), 
+                             healthy_color=(0,180,0)):
+    """ Set color of vertices at max scale according to presence of 
+        fungal objects in property 'fungal_property' """
+    if 'color' not in g.properties():
+        g.add_property('color')
+    colors = g.property('color')
+    infected = g.property(fungal_property)
+    for v in g.vertices(scale=g.max_scale()):
+        colors[v] = infected_color if v in infected else healthy_color
 
 def plot_lesions(g):
     """ plot the plant with infected elements in red """
     from alinea.adel.mtg_interpreter import plot3d
     from openalea.plantgl.all import Viewer
     
-    green = (0,180,0)
-    red = (180, 0, 0)
-    for v in g.vertices(scale=g.max_scale()) : 
-        n = g.node(v)
-        if 'lesions' in n.properties():
-            n.color = red
-        else : 
-            n.color = green
+    _color_infected_vertices(g, 'lesions')
     
     scene = plot3d(g)
     Viewer.display(scene)
@@ -91,19 +119,12 @@ def plot_dispersal_units(g):
     from alinea.adel.mtg_interpreter import plot3d
     from openalea.plantgl.all import Viewer
     
-    green = (0,180,0)
-    red = (180, 0, 0)
-    for v in g.vertices(scale=g.max_scale()) : 
-        n = g.node(v)
-        if 'dispersal_units' in n.properties():
-            n.color = red
-        else : 
-            n.color = green
+    _color_infected_vertices(g, 'dispersal_units')
     
     scene = plot3d(g)
     Viewer.display(scene)
     
-def compute_lesion_areas_by_leaf(g, label='LeafElement'):
+def compute_lesion_areas_by_leaf(g, label='LeafElement', leaves=None):
     """ Compute lesion area on each part of the MTG given by the label.
     
     Parameters
@@ -112,19 +133,22 @@ def compute_lesion_areas_by_leaf(g, label='LeafElement'):
         MTG representing the canopy
     label: str
         Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
         
     Returns
     -------
     lesion_surfaces_by_leaf: dict([id:surface_lesions])
         Surface of the lesions on each part of the MTG given by the label
     """
-    from alinea.alep.architecture import get_leaves
-    vids = get_leaves(g, label=label)
+    if leaves is None:
+        leaves = get_leaves(g, label=label)
+    vids = leaves
     lesions = g.property('lesions')
     return {vid:(sum(l.surface for l in lesions[vid])
-            if vid in lesions.keys() else 0.) for vid in vids} 
+            if vid in lesions else 0.) for vid in vids} 
 
-def compute_green_lesion_areas_by_leaf(g, label='LeafElement'):
+def compute_green_lesion_areas_by_leaf(g, label='LeafElement', leaves=None):
     """ Compute lesion areas on each green part of the MTG given by the label.
     
     Parameters
@@ -133,34 +157,41 @@ def compute_green_lesion_areas_by_leaf(g, label='LeafElement'):
         MTG representing the canopy
     label: str
         Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
         
     Returns
     -------
     green_lesion_area_by_leaf: dict([id:lesion_area])
         Surface of the lesions on each green part of the MTG given by the label
     """
-    from alinea.alep.architecture import get_leaves
-    vids = get_leaves(g, label=label)
-    lesions = g.property('lesions')
-    areas = g.property('area')
-    green_lengths = g.property('green_length')
-    sen_lengths = g.property('senesced_length')
-    
+    if leaves is None:
+        leaves = get_leaves(g, label=label)
+    vids = leaves
+    return _green_lesion_areas(vids, g.property('lesions'), g.property('area'),
+                               g.property('senesced_length'),
+                               g.property('green_length'))
+
+def _green_lesion_areas(vids, lesions, areas, sen_lengths, green_lengths):
+    """ Compute lesion areas on green parts of leaves from MTG properties """
     gla = {}
     for vid in vids:
-        if vid in lesions.keys():
+        if vid in lesions:
             les_surf = sum(l.surface_alive for l in lesions[vid])
-            ratio_sen = sen_lengths[vid]/(sen_lengths[vid]+green_lengths[vid]) if (sen_lengths[vid]+green_lengths[vid])>0. else 0.
+            sen_length = sen_lengths[vid]
+            length = sen_length + green_lengths[vid]
+            ratio_sen = sen_length/length if length>0. else 0.
             # /!\ TODO : Can be replaced by green_areas[vid]/senesced_areas[vid]
-            if les_surf<=areas[vid]:
+            area = areas[vid]
+            if les_surf<=area:
                 gla[vid]=les_surf*(1-ratio_sen)
             else:
-                gla[vid]=les_surf-(areas[vid]*ratio_sen)
+                gla[vid]=les_surf-(area*ratio_sen)
         else:
             gla[vid]=0.
     return gla
 
-def compute_healthy_area_by_leaf(g, label='LeafElement'):
+def compute_healthy_area_by_leaf(g, label='LeafElement', leaves=None):
     """ Compute healthy area on each part of the MTG given by the label.
     
     Healthy area is green area (without senescence) minus the surface of lesions.
@@ -171,28 +202,35 @@ def compute_healthy_area_by_leaf(g, label='LeafElement'):
         MTG representing the canopy
     label: str
         Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
         
     Returns
     -------
     healthy_by_leaf: dict([id:healthy_area])
         Healthy area on each part of the MTG given by the label
     """
-    from alinea.alep.architecture import get_leaves
-    vids = get_leaves(g, label=label)
+    if leaves is None:
+        leaves = get_leaves(g, label=label)
+    vids = leaves
     # green_areas = g.property('green_area')
 
     areas = g.property('area')
-    labels = g.property('label')
     # positions_senescence = g.property('position_senescence')
     sen_lengths = g.property('senesced_length')
     green_lengths = g.property('green_length')
-    senesced_areas = {k:v*(sen_lengths[k]/(sen_lengths[k]+green_lengths[k]) if (sen_lengths[k]+green_lengths[k])>0. else 0.) for k,v in areas.iteritems() if labels[k].startswith(label)}
+    senesced_areas = {}
+    for vid in vids:
+        sen_length = sen_lengths[vid]
+        length = sen_length + green_lengths[vid]
+        senesced_areas[vid] = areas[vid]*(sen_length/length if length>0. else 0.)
     
     # if len(positions_senescence)>0:
         # senesced_areas = {k:v*(1-positions_senescence[k]) for k,v in areas.iteritems() if labels[k].startswith(label)}
     # else:
         # senesced_areas = {k:0. for k,v in areas.iteritems() if labels[k].startswith(label)}
-    green_lesion_areas = compute_green_lesion_areas_by_leaf(g, label)
+    green_lesion_areas = _green_lesion_areas(vids, g.property('lesions'), areas,
+                                             sen_lengths, green_lengths)
     
     # return {vid:(areas[vid] - (senesced_areas[vid] + green_lesion_areas[vid])
         # if round(areas[vid],10)>round((senesced_areas[vid] + green_lesion_areas[vid]),10) else 0.)
@@ -200,7 +238,120 @@ def compute_healthy_area_by_leaf(g, label='LeafElement'):
         
     return {vid:(areas[vid] - (senesced_areas[vid] + green_lesion_areas[vid])) for vid in vids}
     
-def compute_severity_by_leaf(g, label='LeafElement'):
+def _blade_percentage(area, les, blade):
+    """ Compute the percentage of area covered by lesions on each leaf element.
+    
+    Lesion area exceeding the area of a leaf element (percentage of 100) is 
+    shared between the other elements of its blade. Elements without area 
+    get 0. Only works on arrays, so that it can be used on any layout of 
+    leaf data.
+    
+    Parameters
+    ----------
+    area: array
+        Area of each leaf element
+    les: array
+        Lesion area on each leaf element
+    blade: array of int
+        Index of the blade of each leaf element
+        
+    Returns
+    -------
+    percentage: array
+        Percentage of area covered by lesions on each leaf element
+    """
+    diff = area - les
+    valid = area!=0.
+    over = valid & (diff<0)
+    keep = valid & ~over
+    to_share = np.bincount(blade, weights=np.where(over, -diff, 0.))
+    remaining = np.bincount(blade, weights=np.where(keep, diff, 0.))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        factor = np.where(to_share>0, 1-to_share/remaining, 1.)
+        percentage = 100.*(1-diff*factor[blade]/area)
+    percentage[over] = 100.
+    percentage[~valid] = 0.
+    return percentage
+
+def _severity_and_necrosis_arrays(g, label='LeafElement', leaves=None,
+                                  severity=True, necrosis=True):
+    """ Compute arrays of severity and necrosis percentage on each part of 
+        the MTG given by the label, browsing lesions of each leaf only once.
+    
+    Parameters
+    ----------
+    g: MTG
+        MTG representing the canopy
+    label: str
+        Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
+    severity: bool
+        True if severity must be computed
+    necrosis: bool
+        True if necrosis percentage must be computed (requires lesions
+        with a 'necrotic_area')
+        
+    Returns
+    -------
+    leaves: list
+        Ids of the parts of the MTG given by the label
+    severity: array or None
+        Severity on each part of the MTG given by the label
+    necrosis: array or None
+        Necrosis percentage on each part of the MTG given by the label
+    """
+    if leaves is None:
+        leaves = get_leaves(g, label=label)
+    total_areas = g.property('area')
+    lesions = g.property('lesions')
+    nb_leaves = len(leaves)
+    area = np.fromiter((total_areas[vid] for vid in leaves), 
+                       dtype=float, count=nb_leaves)
+    lesion_area = np.zeros(nb_leaves)
+    necrotic_area = np.zeros(nb_leaves)
+    for i, vid in enumerate(leaves):
+        if vid in lesions:
+            surface = 0.
+            necrosis_surface = 0.
+            for lesion in lesions[vid]:
+                if severity:
+                    surface += lesion.surface
+                if necrosis:
+                    necrosis_surface += lesion.necrotic_area
+            lesion_area[i] = surface
+            necrotic_area[i] = necrosis_surface
+    
+    # Leaf elements with consecutive ids belong to the same blade
+    blade = np.zeros(nb_leaves, dtype=int)
+    blade[1:] = np.cumsum(np.diff(leaves)!=1)
+    
+    sev = None
+    nec = None
+    if severity:
+        sev = _blade_percentage(area, lesion_area, blade)
+        sev = np.fmax(0., np.fmin(100., sev))
+    if necrosis:
+        nec = _blade_percentage(area, necrotic_area, blade)
+    return leaves, sev, nec
+
+def _compute_severity_and_necrosis_by_leaf(g, label='LeafElement', leaves=None,
+                                           severity=True, necrosis=True):
+    """ Same as _severity_and_necrosis_arrays with results in dicts by leaf
+        (None if not computed) """
+    leaves, sev, nec = _severity_and_necrosis_arrays(g, label=label, 
+                                                     leaves=leaves,
+                                                     severity=severity, 
+                                                     necrosis=necrosis)
+    severity_by_leaf = None
+    necrosis_by_leaf = None
+    if sev is not None:
+        severity_by_leaf = dict(zip(leaves, sev.tolist()))
+    if nec is not None:
+        necrosis_by_leaf = dict(zip(leaves, nec.tolist()))
+    return severity_by_leaf, necrosis_by_leaf
+
+def compute_severity_by_leaf(g, label='LeafElement', leaves=None):
     """ Compute severity of the disease on each part of the MTG given by the label.
     
     Severity is the ratio between disease surface and total leaf area (in %).
@@ -211,47 +362,19 @@ def compute_severity_by_leaf(g, label='LeafElement'):
         MTG representing the canopy
     label: str
         Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
         
     Returns
     -------
     severity_by_leaf: dict([id:severity])
         Severity on each part of the MTG given by the label
     """
-    from alinea.alep.architecture import get_leaves
-    leaves = get_leaves(g, label=label)
-    total_areas = g.property('area')
-    lesion_areas = compute_lesion_areas_by_leaf(g, label)
-    
-    # Calculate by blade
-    blades = np.array_split(leaves,np.where(np.diff(leaves)!=1)[0]+1)
-    sev={}
-    for bl in blades:
-        area_bl = np.array([total_areas[lf] for lf in bl])
-        if any(area_bl==0.):
-            for lf in bl[area_bl==0.]:
-                sev[lf]=0.
-            bl = np.delete(bl,np.where(area_bl==0.))
-            area_bl = np.delete(area_bl,np.where(area_bl==0.))
-        les_bl = np.array([lesion_areas[lf] for lf in bl])
-        diff = area_bl - les_bl
-        if any(diff<0):
-            for lf in bl[diff<0]:
-                sev[lf]=100.
-            to_share = abs(sum(diff[diff<0]))
-            bl = np.delete(bl,np.where(diff<0))
-            area_bl = np.delete(area_bl,np.where(diff<0))
-            diff = np.delete(diff,np.where(diff<0))
-            diff*=1-to_share/sum(diff)
-        for ind in range(len(bl)):
-            if diff[ind]>area_bl[ind]:
-                import pdb
-                pdb.set_trace()
-            sev[bl[ind]] = max(0, min(100, 100.*(1-diff[ind]/area_bl[ind])))
-    
     #return {vid:(100*lesion_areas[vid]/float(total_areas[vid]) if total_areas[vid]>0. else 0.) for vid in vids}
-    return sev
+    return _compute_severity_and_necrosis_by_leaf(g, label=label, leaves=leaves,
+                                                  necrosis=False)[0]
     
-def compute_senescence_by_leaf(g, label='LeafElement'):
+def compute_senescence_by_leaf(g, label='LeafElement', leaves=None):
     """ Compute senescence on parts of the MTG given by the label.
     
     Parameters
@@ -260,18 +383,23 @@ def compute_senescence_by_leaf(g, label='LeafElement'):
         MTG representing the canopy
     label: str
         Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
         
     Returns
     -------
     senescence_by_leaf: dict([id:senescence_area])
         Senescence on each part of the MTG given by the label    
     """
-    labels = g.property('label')
-    total_areas = {k:v for k,v in g.property('area').iteritems() if labels[k].startswith(label)}
+    if leaves is None:
+        leaves = get_leaves(g, label=label)
+    vids = leaves
+    total_areas = g.property('area')
     pos_sen = g.property('position_senescence')
     sen = {}
-    for vid in total_areas.iterkeys():
-        sen[vid] = total_areas[vid]*(1-pos_sen[vid])
+    for vid in vids:
+        if vid in total_areas:
+            sen[vid] = total_areas[vid]*(1-pos_sen[vid])
     return sen
     
 def compute_senescence_necrosis_by_leaf(g, label='LeafElement'):
@@ -294,13 +422,17 @@ def compute_senescence_necrosis_by_leaf(g, label='LeafElement'):
     lesions = g.property('lesions')
     pos_sen = g.property('position_senescence')
     nec_sen = {}
-    for vid in total_areas.iterkeys():
-        if vid in lesions.keys():
+    for vid in total_areas:
+        if vid in lesions:
             # Note G.Garin 16/12/13:
             # Little hack when senescence reaches leaf basis to account 
             # non localized lesion growth with available space. 
-            nec_on_green = sum(lesion.necrotic_area for lesion in lesions[vid] if not lesion.is_senescent)
-            les_on_green = sum(lesion.surface for lesion in lesions[vid] if not lesion.is_senescent)
+            nec_on_green = 0.
+            les_on_green = 0.
+            for lesion in lesions[vid]:
+                if not lesion.is_senescent:
+                    nec_on_green += lesion.necrotic_area
+                    les_on_green += lesion.surface
             ratio_nec_on_green = nec_on_green/les_on_green if les_on_green>0. else 0.
             nec = min(nec_on_green, (total_areas[vid]*pos_sen[vid] - healthy_areas[vid])*ratio_nec_on_green)
             sen = total_areas[vid]*(1-pos_sen[vid])
@@ -309,7 +441,7 @@ def compute_senescence_necrosis_by_leaf(g, label='LeafElement'):
             nec_sen[vid] = 0.
     return nec_sen
 
-def compute_necrosis_percentage_by_leaf(g, label='LeafElement'):
+def compute_necrosis_percentage_by_leaf(g, label='LeafElement', leaves=None):
     """ Compute necrosis percentage on each part of the MTG given by the label.
     
     Necrosis percentage is the ratio between necrotic area and total leaf area.
@@ -324,51 +456,17 @@ def compute_necrosis_percentage_by_leaf(g, label='LeafElement'):
         MTG representing the canopy
     label: str
         Label of the part of the MTG concerned by the calculation
+    leaves: list
+        Ids of the parts of the MTG given by the label (computed if None)
         
     Returns
     -------
     necrosis_by_leaf: dict([id:necrosis_percentage])
         Necrosis percentage on each part of the MTG given by the label
     """
-    from alinea.alep.architecture import get_leaves
-    leaves = get_leaves(g, label=label)
-    total_areas = g.property('area')
-    lesions = g.property('lesions')
-    necrotic_areas = {}
-    for vid in total_areas.iterkeys():
-        if vid in lesions.keys():
-            necrotic_areas[vid] = sum([lesion.necrotic_area for lesion in lesions[vid]])
-        else:
-            necrotic_areas[vid] = 0.
-            
-    # Calculate by blade
-    blades = np.array_split(leaves,np.where(np.diff(leaves)!=1)[0]+1)
-    necrosis_by_leaf={}
-    for bl in blades:
-        area_bl = np.array([total_areas[lf] for lf in bl])
-        if any(area_bl==0.):
-            for lf in bl[area_bl==0.]:
-                necrosis_by_leaf[lf]=0.
-            bl = np.delete(bl,np.where(area_bl==0.))
-            area_bl = np.delete(area_bl,np.where(area_bl==0.))
-        nec_bl = np.array([necrotic_areas[lf] for lf in bl])
-        diff = area_bl - nec_bl
-        if any(diff<0):
-            for lf in bl[diff<0]:
-                necrosis_by_leaf[lf]=100.
-            to_share = abs(sum(diff[diff<0]))
-            bl = np.delete(bl,np.where(diff<0))
-            area_bl = np.delete(area_bl,np.where(diff<0))
-            diff = np.delete(diff,np.where(diff<0))
-            diff*=1-to_share/sum(diff)
-        for ind in range(len(bl)):
-            if diff[ind]>area_bl[ind]:
-                import pdb
-                pdb.set_trace()
-            necrosis_by_leaf[bl[ind]] = 100.*(1-diff[ind]/area_bl[ind])
-    
     #return {vid:(100*necrotic_areas[vid]/float(total_areas[vid]) if total_areas[vid]>0. else 0.) for vid in vids}
-    return necrosis_by_leaf
+    return _compute_severity_and_necrosis_by_leaf(g, label=label, leaves=leaves,
+                                                  severity=False)[1]
     
 def compute_necrotic_area_by_leaf(g, label='LeafElement'):
     """ Compute necrosis percentage on each part of the MTG given by the label.
@@ -394,8 +492,8 @@ def compute_necrotic_area_by_leaf(g, label='LeafElement'):
     total_areas = g.property('area')
     lesions = g.property('lesions')
     necrotic_areas = {}
-    for vid in total_areas.iterkeys():
-        if vid in lesions.keys():
+    for vid in total_areas:
+        if vid in lesions:
             necrotic_areas[vid] = sum(lesion.necrotic_area for lesion in lesions[vid])
         else:
             necrotic_areas[vid] = 0.
@@ -418,9 +516,8 @@ def compute_total_severity(g, label='LeafElement'):
     severity: float
         Ratio between disease surface and green leaf area (in %)
     """
-    from numpy import mean
-    severities = compute_severity_by_leaf(g, label=label)
-    return mean(severities.values())
+    sev = _severity_and_necrosis_arrays(g, label=label, necrosis=False)[1]
+    return sev.mean()
     
 def compute_total_necrosis_percentage(g, label='LeafElement'):
     """ Compute necrosis percentage on the whole plant.
@@ -439,9 +536,8 @@ def compute_total_necrosis_percentage(g, label='LeafElement'):
     necrosis_percentage: float
         Ratio between necrotic (and sporulating) disease area and total area of leaves (in %)
     """   
-    from numpy import mean
-    nec = compute_necrosis_percentage_by_leaf(g, label=label)
-    return mean(nec.values())
+    nec = _severity_and_necrosis_arrays(g, label=label, severity=False)[2]
+    return nec.mean()
 
 def compute_total_necrotic_area(g, label='LeafElement'):
     """ Compute necrosis percentage on the whole plant.
@@ -460,9 +556,10 @@ def compute_total_necrotic_area(g, label='LeafElement'):
     necrotic_area: float
         Total area of leaves covered by necrotic surfaces of lesions (in cm2)
     """
-    from numpy import mean
-    nec = compute_necrotic_area_by_leaf(g, label=label)
-    return sum(nec.values())
+    total_areas = g.property('area')
+    lesions = g.property('lesions')
+    return sum(lesion.necrotic_area for vid, les in lesions.iteritems() 
+               if vid in total_areas for lesion in les)
 
 def compute_normalised_audpc(necrosis, total_area):
     """ Compute the normalised AUDPC as in Robert et al. 2008
@@ -486,13 +583,9 @@ def compute_normalised_audpc(necrosis, total_area):
     normalised_audpc: float
        AUDPC divided by a theoretical maximum value
     """
-    import numpy as np
-    from scipy.integrate import trapz
-    full_necrosis = np.array([100. if total_area[k]>0. else 0. 
-                              for k in range(len(total_area))])
-    
-    audpc = trapz(necrosis, dx=1)
-    theo_audpc = trapz(full_necrosis, dx=1)
+    full_necrosis = 100. * (np.asarray(total_area) > 0.)
+    audpc = np.trapz(np.asarray(necrosis), dx=1)
+    theo_audpc = np.trapz(full_necrosis, dx=1)
     return 100*audpc/theo_audpc if theo_audpc>0. else 0.
  
 def plot3d_transparency(g, 
@@ -528,38 +621,61 @@ def plot3d_transparency(g,
 
     def geom2shape(vid, mesh, scene):
         shape = None
-        if isinstance(mesh, list):
-            for m in mesh:
-                geom2shape(vid, m, scene)
-            return
         if mesh is None:
             return
         if isinstance(mesh, Shape):
             shape = mesh
             mesh = mesh.geometry
-        label = labels.get(vid)
-        is_green = greeness.get(vid)
         if colors:
+            color = Color3(* colors.get(vid, [0,0,0]) )
             if transparencies==None:
-                shape = Shape(mesh, Material(Color3(* colors.get(vid, [0,0,0]) )))
+                shape = Shape(mesh, Material(color))
             else:
-                shape = Shape(mesh, Material(Color3(* colors.get(vid, [0,0,0]) ), transparency=transparencies.get(vid,0)))
+                shape = Shape(mesh, Material(color, transparency=transparencies.get(vid,0)))
         elif not greeness:
             if not shape:
                 shape = Shape(mesh)
-        elif label.startswith('Stem') and is_green:
-            shape = Shape(mesh, stem_material)
-        elif label.startswith('Leaf') and is_green:
-            shape = Shape(mesh, leaf_material)
-        elif not is_green:
-            shape = Shape(mesh, soil_material)
+        else:
+            label = labels.get(vid)
+            is_green = greeness.get(vid)
+            if label.startswith('Stem') and is_green:
+                shape = Shape(mesh, stem_material)
+            elif label.startswith('Leaf') and is_green:
+                shape = Shape(mesh, leaf_material)
+            elif not is_green:
+                shape = Shape(mesh, soil_material)
         shape.id = vid
         scene.add(shape)
 
     for vid, mesh in geometries.iteritems():
-        geom2shape(vid, mesh, scene)
+        # Walk nested lists of meshes with an explicit stack, in order
+        stack = [mesh]
+        while stack:
+            m = stack.pop()
+            if isinstance(m, list):
+                stack.extend(reversed(m))
+            else:
+                geom2shape(vid, m, scene)
     return scene
 
+def _whiten_healthy_vertices(g, severity_by_leaf, transparency):
+    """ Color in white the vertices without severity and set transparencies
+        used by plot3d_transparency (0.9 on vertices without severity value,
+        'transparency' on healthy leaves, 0. on diseased leaves) """
+    g.add_property('transparency')
+    transparencies = g.property('transparency')
+    transparencies.update(dict.fromkeys(g, 0.9))
+    diseased = set()
+    for vid, sev in severity_by_leaf.iteritems():
+        if sev==0.:
+            transparencies[vid] = transparency
+        else:
+            transparencies[vid] = 0.
+            diseased.add(vid)
+    node = g.node
+    for vid in set(g) - diseased:
+        node(vid).color = (255,255,255)
+
 def plot_severity_by_leaf(g, senescence=True, transparency=None, label='LeafElement'):
     """ Display the MTG with colored leaves according to disease severity 
     
@@ -580,13 +696,12 @@ def plot_severity_by_leaf(g, senescence=True, transparency=None, label='LeafElem
         Scene containing the MTG attacked by the disease
     
     """
-    from alinea.alep.architecture import set_property_on_each_id, get_leaves
-    from alinea.alep.disease_outputs import compute_severity_by_leaf
     from alinea.alep.alep_color import alep_colormap, green_yellow_red
     from alinea.adel.mtg_interpreter import plot3d
     from openalea.plantgl.all import Viewer
     # Compute severity by leaf
-    severity_by_leaf = compute_severity_by_leaf(g, label=label)
+    leaves = get_leaves(g, label=label)
+    severity_by_leaf = compute_severity_by_leaf(g, label=label, leaves=leaves)
     set_property_on_each_id(g, 'severity', severity_by_leaf, label=label)
 
     # Visualization
@@ -594,7 +709,6 @@ def plot_severity_by_leaf(g, senescence=True, transparency=None, label='LeafElem
                       lognorm=False, zero_to_one=False, vmax=100)
 
     if senescence==True:
-        leaves = get_leaves(g, label=label)
         # pos_sen = g.property('position_senescence')
         sen_lengths = g.property('senesced_length')
         green_lengths = g.property('green_length')
@@ -603,16 +717,7 @@ def plot_severity_by_leaf(g, senescence=True, transparency=None, label='LeafElem
                 g.node(leaf).color = (157, 72, 7)
     
     if transparency!=None:
-        for id in g:
-            if not id in severity_by_leaf:
-                g.node(id).color = (255,255,255)
-                g.node(id).transparency = 0.9
-            elif severity_by_leaf[id]==0.:
-                g.node(id).color = (255,255,255)
-                g.node(id).transparency = transparency
-            else:
-                g.node(id).transparency = 0.
-        
+        _whiten_healthy_vertices(g, severity_by_leaf, transparency)
         scene = plot3d_transparency(g)
     else:
         scene = plot3d(g)
@@ -620,8 +725,6 @@ def plot_severity_by_leaf(g, senescence=True, transparency=None, label='LeafElem
     return scene
 
 def plot_severity_vine(g, trunk=True, transparency=None, label='lf'):
-    from alinea.alep.architecture import set_property_on_each_id
-    from alinea.alep.disease_outputs import compute_severity_by_leaf
     from alinea.alep.alep_color import alep_colormap, green_yellow_red
     from alinea.adel.mtg_interpreter import plot3d
     from openalea.plantgl.all import Viewer
@@ -640,15 +743,7 @@ def plot_severity_vine(g, trunk=True, transparency=None, label='lf'):
             trunk.color = brown
             
     if transparency!=None:
-        for id in g:
-            if not id in severity_by_leaf:
-                g.node(id).color = (255,255,255)
-                g.node(id).transparency = 0.9
-            elif severity_by_leaf[id]==0.:
-                g.node(id).color = (255,255,255)
-                g.node(id).transparency = transparency
-            else:
-                g.node(id).transparency = 0.
+        _whiten_healthy_vertices(g, severity_by_leaf, transparency)
         scene = plot3d_transparency(g)
     else:
         scene = plot3d(g)
@@ -688,10 +783,6 @@ def save_image(scene, image_name='%s/img%04d.%s', directory='.', index=0, ext='p
     return scene,
  
 ######################################################################
-from numpy import mean
-import numpy as np
-from scipy.integrate import trapz
-
 class VineLeafInspector:
     def __init__(self, leaf_id, label='lf'):
         self.leaf_id = leaf_id
@@ -737,19 +828,14 @@ class VineLeafInspector:
         surface_latent = 0.
         surface_spo = 0.
         surface_empty = 0.
-        if len(lesions)>0.:
-            latent_lesions = [l for l in lesions if l.is_latent()]
-            if len(latent_lesions)>0.:
-                surface_latent = sum([l.surface for l in latent_lesions])
-            
-            spo_lesions = [l for l in lesions if l.is_sporulating()]
-            if len(spo_lesions)>0.:
-                surface_spo = sum([l.surface for l in spo_lesions])
-            
-            empty_lesions = [l for l in lesions if l.is_empty()]
-            if len(empty_lesions)>0.:
-                surface_empty = sum([l.surface for l in empty_lesions])
-                
+        for l in lesions:
+            if l.is_latent():
+                surface_latent += l.surface
+            elif l.is_sporulating():
+                surface_spo += l.surface
+            elif l.is_empty():
+                surface_empty += l.surface
+
         self.surface_latent.append(surface_latent)
         self.ratio_latent.append(100.*surface_latent/area if area>0. else 0.)
         self.surface_spo.append(surface_spo)
@@ -758,18 +844,41 @@ class VineLeafInspector:
         self.ratio_empty.append(100.*surface_empty/area if area>0. else 0.)
 
 ###############################################################################
+# Plant and metamer numbers in adel labels ('plant1_MS_metamer3_blade_...')
+_ADEL_LABEL = re.compile(r'plant(\d+)_[^_]*_metamer(\d+)')
+
+def _safe_ratio(values, against):
+    """ Ratio between two arrays, 0. where 'against' is null """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(against > 0., values/against, 0.)
+
 class AdelWheatRecorder(object):
     """ Record simulation output on every leaf of main stems in a dataframe during simulation """
     def __init__(self, group_dus = True, 
-                 fungus_name = 'template', increment = 1000):
+                 fungus_name = 'template', increment = 1000, 
+                 dtype = np.float64):
         self.fungus_name = fungus_name
         self.group_dus = group_dus
         self.increment = increment
+        # Type of numeric columns (np.float32 halves memory of long records)
+        self.dtype = dtype
+        self.nb_lines = 0
+        self._data = None
         columns = ['date', 'degree_days', 'num_plant', 'num_leaf_bottom', 
                    'leaf_area', 'leaf_green_area', 'fnl']
-        self.data = pandas.DataFrame(data = [[np.nan for col in columns] 
-                                    for i in range(increment)], 
-                                    columns = columns)
+        self.init_data(columns)
+
+    def _empty_column(self, column, length):
+        if column == 'date':
+            return np.empty(length, dtype=object)
+        return np.full(length, np.nan, dtype=self.dtype)
+
+    def init_data(self, columns):
+        """ Allocate one array per column, filled by line index during 
+            simulation and gathered in a dataframe by 'to_frame' """
+        self.columns = columns
+        self.data_columns = {col:self._empty_column(col, self.increment)
+                             for col in columns}
     
     def get_values_single_leaf(self, g, date, degree_days, id_list):
         dict_lf = {}
@@ -780,24 +889,54 @@ class AdelWheatRecorder(object):
         areas = g.property('area')
         green_areas = g.property('green_area')
         fnls = g.property('nff')
-        a_label_splitted = self.a_labels[id_list[0]].split('_')
-        dict_lf['num_plant'] = int(a_label_splitted[0].split('plant')[1])
-        dict_lf['num_leaf_bottom'] = int(a_label_splitted[2].split('metamer')[1])
-        dict_lf['leaf_area'] = sum([areas[id] for id in id_list])
-        dict_lf['leaf_green_area'] = sum([green_areas[id] for id in id_list])
+        num_plant, num_metamer = _ADEL_LABEL.match(self.a_labels[id_list[0]]).groups()
+        dict_lf['num_plant'] = int(num_plant)
+        dict_lf['num_leaf_bottom'] = int(num_metamer)
+        dict_lf['leaf_area'] = sum(areas[id] for id in id_list)
+        dict_lf['leaf_green_area'] = sum(green_areas[id] for id in id_list)
         dict_lf['fnl'] =  fnls[g.complex_at_scale(id_list[0], 2)]
         return dict_lf
 
     def increment_data(self):
-        df = pandas.DataFrame(data = [[np.nan for col in self.data.columns] 
-                                for i in range(self.increment)], 
-                                columns = self.data.columns)
-        self.data = pandas.concat([self.data, df])
-        self.data = self.data.reset_index(drop = True)
+        for col, values in self.data_columns.iteritems():
+            self.data_columns[col] = np.concatenate(
+                        [values, self._empty_column(col, self.increment)])
         
     def add_line_from_dict(self, dict_lf={}):
-        indx = self.data[self.data['date'].isnull()].index[0]
-        self.data.loc[indx, :] = pandas.Series(dict_lf)
+        if self.nb_lines >= len(self.data_columns['date']):
+            self.increment_data()
+        for col, value in dict_lf.iteritems():
+            # Values without a column are not recorded
+            if col in self.data_columns:
+                self.data_columns[col][self.nb_lines] = value
+        self.nb_lines += 1
+
+    def to_frame(self):
+        """ Gather recorded lines with a date in a dataframe """
+        if self.data_columns is None:
+            return self.data
+        dated = pandas.notnull(self.data_columns['date'][:self.nb_lines])
+        return pandas.DataFrame({col:self.data_columns[col][:self.nb_lines][dated]
+                                 for col in self.columns}, 
+                                 columns = self.columns)
+        
+    def gather_data(self):
+        """ Build the dataframe of recorded lines and free the columns """
+        self.data = self.to_frame()
+        self.data_columns = None
+
+    @property
+    def data(self):
+        """ Recorded data, built from the columns until 'gather_data' """
+        # Recorders pickled before the columns were introduced store 'data'
+        data = self.__dict__.get('_data', self.__dict__.get('data'))
+        if data is None:
+            return self.to_frame()
+        return data
+
+    @data.setter
+    def data(self, data):
+        self._data = data
         
     def get_ids_on_blade(self, components, geometries=None, 
                          areas=None, labels=None):
@@ -822,28 +961,52 @@ class AdelWheatRecorder(object):
                                                       degree_days = degree_days, 
                                                       id_list = id_list)
                 self.add_line_from_dict(dict_lf)
-                if len(self.data[self.data['date'].isnull()]) == 0.:
-                    self.increment_data()
                     
     def add_leaf_numbers(self):
-        self.data['axis'] = 'MS'
-        for pl in set(self.data['num_plant']):
-            df_ax = self.data[self.data['num_plant'] == pl]
-            fnl = df_ax['fnl'].max()
-            df_ax.loc[:, 'num_leaf_top'] = fnl - df_ax['num_leaf_bottom'] + 1
-            self.data.loc[df_ax.index, 'num_leaf_top'] = fnl - df_ax['num_leaf_bottom'] + 1
-            for date in set(df_ax['degree_days']):
-                df_date = df_ax[df_ax['degree_days'] == date]
-                current_max_bottom = df_date['num_leaf_bottom'].max()
-                cur_max_leaf_top = df_date['fnl'] - current_max_bottom + 1
-                self.data.loc[df_date.index, 'cur_max_leaf_top'] = cur_max_leaf_top
-                self.data.loc[df_date.index, 'cur_num_leaf_top'] = cur_max_leaf_top - df_date['num_leaf_top'] + 1
+        df = self.data
+        df['axis'] = 'MS'
+        fnl = df.groupby('num_plant')['fnl'].transform('max')
+        df['num_leaf_top'] = fnl - df['num_leaf_bottom'] + 1
+        current_max_bottom = df.groupby(['num_plant', 'degree_days'])['num_leaf_bottom'].transform('max')
+        df['cur_max_leaf_top'] = df['fnl'] - current_max_bottom + 1
+        df['cur_num_leaf_top'] = df['cur_max_leaf_top'] - df['num_leaf_top'] + 1
                 
     def add_variety(self, variety = None):
         self.data['variety'] = variety
+
+    def _ratio(self, variable='leaf_necrotic_area', against='leaf_area'):
+        """ Ratio between two columns, 0. where 'against' is null """
+        return _safe_ratio(self.data[variable].values, self.data[against].values)
+
+    def get_audpc(self, variable='severity'):
+        """ Add AUDPC of 'variable' on each leaf of each plant, normalized by 
+            the AUDPC of a leaf fully infected while green """
+        for _, df_lf in self.data.groupby(['num_plant', 'num_leaf_top']):
+            ind_data_lf = df_lf.index
+            green_area = df_lf['leaf_green_area'].values
+            values = df_lf[variable].values
+            if round(green_area[pandas.notnull(values)][-1],10)==0.:
+                green = green_area>0
+                data = values[green]
+                ddays = df_lf['degree_days'].values[green]
+                infected = data>0
+                if infected.any():
+                    audpc = simps(data[infected], ddays[infected])
+                    if numpy.isnan(audpc):
+                        audpc = trapz(data[infected], ddays[infected])
+                    # Both rules are exact on a constant curve
+                    audpc_ref = numpy.trapz(numpy.ones(len(data)), ddays)
+                else:
+                    audpc = 0.
+                    audpc_ref = 0.
+                self.data.loc[ind_data_lf, 'audpc'] = audpc
+                self.data.loc[ind_data_lf, 'normalized_audpc'] = audpc/audpc_ref if audpc_ref>0. else 0.
+            else:
+                self.data.loc[ind_data_lf, 'audpc'] = np.nan
+                self.data.loc[ind_data_lf, 'normalized_audpc'] = np.nan
     
     def post_treatment(self, variety = None):
-        self.data = self.data[~pandas.isnull(self.data['date'])]
+        self.gather_data()
         self.add_leaf_numbers()
         if variety is not None:
             self.add_variety(variety=variety)
@@ -866,10 +1029,11 @@ class AdelSeptoRecorder(AdelWheatRecorder):
     """ Record simulation output on every leaf of main stems in a dataframe during simulation """
     def __init__(self, group_dus = True, 
                  fungus_name = 'septoria', 
-                 increment = 1000, add_height=False):
+                 increment = 1000, add_height=False, dtype = np.float64):
         super(AdelSeptoRecorder, self).__init__(group_dus = group_dus, 
                                                 fungus_name = fungus_name,
-                                                increment = increment)
+                                                increment = increment,
+                                                dtype = dtype)
         columns = ['date', 'degree_days', 'num_plant', 'num_leaf_bottom', 'leaf_area', 
                    'leaf_green_area', 'leaf_length', 'leaf_senesced_length', 'fnl',
                    'nb_dispersal_units', 'nb_lesions', 'nb_lesions_on_green', 
@@ -879,8 +1043,7 @@ class AdelSeptoRecorder(AdelWheatRecorder):
         self.add_height = add_height
         if add_height:
             columns += ['leaf_height_basis', 'leaf_height_top']
-        self.data = pandas.DataFrame(data = [[np.nan for col in columns] for i in range(self.increment)], 
-                                     columns = columns)
+        self.init_data(columns)
     
     def get_values_single_leaf(self, g, date, degree_days, id_list):
         dict_lf = {}
@@ -893,17 +1056,20 @@ class AdelSeptoRecorder(AdelWheatRecorder):
         lengths = g.property('length')
         senesced_lengths = g.property('senesced_length')
         fnls = g.property('nff')
-        a_label_splitted = self.a_labels[id_list[0]].split('_')
-        dict_lf['num_plant'] = int(a_label_splitted[0].split('plant')[1])
-        dict_lf['num_leaf_bottom'] = int(a_label_splitted[2].split('metamer')[1])
-        dict_lf['leaf_area'] = sum([areas[id] for id in id_list])
-        dict_lf['leaf_green_area'] = sum([green_areas[id] for id in id_list])
+        num_plant, num_metamer = _ADEL_LABEL.match(self.a_labels[id_list[0]]).groups()
+        dict_lf['num_plant'] = int(num_plant)
+        dict_lf['num_leaf_bottom'] = int(num_metamer)
+        dict_lf['leaf_area'] = sum(areas[id] for id in id_list)
+        dict_lf['leaf_green_area'] = sum(green_areas[id] for id in id_list)
         if self.add_height:
-            heights = get_height(g.property('geometry'))
+            # Only the first and last leaf elements are needed
+            geometries = g.property('geometry')
+            heights = get_height({vid:geometries[vid] 
+                                  for vid in (id_list[0], id_list[-1])})
             dict_lf['leaf_height_basis'] = heights[id_list[0]][0]
             dict_lf['leaf_height_top'] = heights[id_list[-1]][-1]
-        dict_lf['leaf_length'] = sum([lengths[id] for id in id_list])
-        dict_lf['leaf_senesced_length'] = sum([senesced_lengths[id] for id in id_list])
+        dict_lf['leaf_length'] = sum(lengths[id] for id in id_list)
+        dict_lf['leaf_senesced_length'] = sum(senesced_lengths[id] for id in id_list)
         dict_lf['fnl'] =  fnls[g.complex_at_scale(id_list[0], 2)]
 
         # Update properties of dispersal units and lesions
@@ -920,20 +1086,23 @@ class AdelSeptoRecorder(AdelWheatRecorder):
         surface_empty_on_green = 0.
         surface_dead = 0.
         
+        fungus_name = self.fungus_name
+        group_dus = self.group_dus
+        dispersal_units = g.property('dispersal_units')
+        lesions = g.property('lesions')
         for id in id_list:
-            leaf = g.node(id)
-            if 'dispersal_units' in leaf.properties():
-                for du in leaf.dispersal_units:
-                    if du.fungus.name == self.fungus_name:
-                        if self.group_dus:
+            if id in dispersal_units:
+                for du in dispersal_units[id]:
+                    if du.fungus.name == fungus_name:
+                        if group_dus:
                             nb_dus += du.nb_dispersal_units
                         else:
                             nb_dus += 1
                                 
-            if 'lesions' in leaf.properties():
-                for les in leaf.lesions:
-                    if les.fungus.name == self.fungus_name:
-                        if self.group_dus:
+            if id in lesions:
+                for les in lesions[id]:
+                    if les.fungus.name == fungus_name:
+                        if group_dus:
                             nb_les = les.nb_lesions
                             nb_les_on_green = les.nb_lesions_non_sen
                             nb_lesions += nb_les
@@ -944,7 +1113,7 @@ class AdelSeptoRecorder(AdelWheatRecorder):
                             surface_empty_on_green += les.surface_empty * ratio_green
                         else:
                             nb_lesions += 1
-                            if les.position[0][0]>leaf.senesced_length:
+                            if les.position[0][0]>senesced_lengths[id]:
                                 nb_lesions_on_green += 1
                                 surface_nec_on_green = les.surface_nec_on_green
                                 surface_spo_on_green = les.surface_spo
@@ -986,21 +1155,12 @@ class AdelSeptoRecorder(AdelWheatRecorder):
                                           self.data['surface_empty']         
 
     def leaf_necrotic_area_on_green(self):
-        self.data['leaf_necrotic_area_on_green'] = self.data['surface_spo_on_green'] + \
-                                                   self.data['surface_empty_on_green']
-        indx = self.data['leaf_necrotic_area_on_green']>self.data['leaf_green_area']
-        self.data['leaf_necrotic_area_on_green'][indx] = self.data['leaf_green_area'][indx]
+        nec_on_green = (self.data['surface_spo_on_green'].values + 
+                        self.data['surface_empty_on_green'].values)
+        green_area = self.data['leaf_green_area'].values
+        self.data['leaf_necrotic_area_on_green'] = np.where(nec_on_green > green_area,
+                                                            green_area, nec_on_green)
 
-    def _ratio(self, variable='leaf_necrotic_area', against='leaf_area'):
-        r = []
-        for ind in self.data.index:
-            a = self.data[against][ind]
-            if a > 0.:
-                r.append(self.data[variable][ind]/a)
-            else:
-                r.append(0.)
-        return r
-    
     def severity(self):
         """ Necrotic area of lesions compared to total leaf area """
         if not 'leaf_necrotic_area' in self.data:
@@ -1027,63 +1187,56 @@ class AdelSeptoRecorder(AdelWheatRecorder):
         self.data['ratio_empty'] = self._ratio(variable='surface_empty',
                                                against='leaf_area')
 
-    def get_audpc(self, variable='severity'):
-        for pl in set(self.data['num_plant']):
-            df_pl =  self.data[self.data['num_plant'] == pl]
-            for lf in set(df_pl['num_leaf_top']):
-                df_lf = df_pl[df_pl['num_leaf_top'] == lf]
-                ind_data_lf = df_lf.index
-                if round(df_lf['leaf_green_area'][pandas.notnull(df_lf[variable])].iloc[-1],10)==0.:
-                    data = df_lf[variable][df_lf['leaf_green_area']>0]
-                    ddays = df_lf['degree_days'][df_lf['leaf_green_area']>0]
-                    data_ref = numpy.ones(len(data))
-                    if len(data[data>0])>0:
-                        audpc = simps(data[data>0], ddays[data>0])
-                        audpc_ref = simps(data_ref[data_ref>0], ddays[data_ref>0])
-                        if numpy.isnan(audpc):
-                            audpc = trapz(data[data>0], ddays[data>0])
-                        if numpy.isnan(audpc_ref):
-                            audpc_ref = trapz(data_ref[data_ref>0], ddays[data_ref>0])
-                    else:
-                        audpc = 0.
-                        audpc_ref = 0.
-                    self.data.loc[ind_data_lf, 'audpc'] = audpc
-                    self.data.loc[ind_data_lf, 'normalized_audpc'] = audpc/audpc_ref if audpc_ref>0. else 0.
-                else:
-                    self.data.loc[ind_data_lf, 'audpc'] = np.nan
-                    self.data.loc[ind_data_lf, 'normalized_audpc'] = np.nan
-                    
+    def leaf_derived_columns(self):
+        """ Add all the columns derived from leaf and lesion surfaces
+            (as the methods above), reading each recorded column once """
+        df = self.data
+        leaf_area = df['leaf_area'].values
+        green_area = df['leaf_green_area'].values
+        surfaces = [(s, df['surface_'+s].values) 
+                    for s in ('inc', 'chlo', 'nec', 'spo', 'empty')]
+        necrotic_area = df['surface_spo'].values + df['surface_empty'].values
+        nec_on_green = (df['surface_spo_on_green'].values + 
+                        df['surface_empty_on_green'].values)
+        nec_on_green = np.where(nec_on_green > green_area, 
+                                green_area, nec_on_green)
+        derived = [('leaf_senesced_area', leaf_area - green_area),
+                   ('leaf_necrotic_area', necrotic_area),
+                   ('leaf_necrotic_area_on_green', nec_on_green),
+                   ('leaf_disease_area', sum(v for s, v in surfaces))]
+        derived += [('ratio_'+s, _safe_ratio(v, leaf_area)) for s, v in surfaces]
+        derived += [('severity', _safe_ratio(necrotic_area, leaf_area)),
+                    ('severity_on_green', _safe_ratio(nec_on_green, green_area))]
+        for col, values in derived:
+            df[col] = values
+
     def get_audpc_long(self, variable='severity', latency_after_inc=210.):
-        for pl in set(self.data['num_plant']):
-            df_pl =  self.data[self.data['num_plant'] == pl]
-            for lf in set(df_pl['num_leaf_top']):
-                df_lf = df_pl[df_pl['num_leaf_top'] == lf]
-                ind_data_lf = df_lf.index
-                date_end_sen = df_lf['degree_days'][df_lf['leaf_green_area']>0].values[-1]
-                if (round(df_lf['leaf_green_area'][pandas.notnull(df_lf[variable])].iloc[-1],10)==0. and
-                    max(df_lf['degree_days']) >= date_end_sen+latency_after_inc):
-                    data = df_lf[variable][df_lf['degree_days']<date_end_sen+latency_after_inc]
-                    ddays = df_lf['degree_days'][df_lf['degree_days']<date_end_sen+latency_after_inc]
-                    if len(data[data>0])>0:
-                        audpc = simps(data[data>0], ddays[data>0])
-                        if numpy.isnan(audpc):
-                            audpc = trapz(data[data>0], ddays[data>0])
-                    else:
-                        audpc = 0.
-                    self.data.loc[ind_data_lf, 'audpc_long'] = audpc
+        for _, df_lf in self.data.groupby(['num_plant', 'num_leaf_top']):
+            ind_data_lf = df_lf.index
+            green_area = df_lf['leaf_green_area'].values
+            values = df_lf[variable].values
+            degree_days = df_lf['degree_days'].values
+            date_end_sen = degree_days[green_area>0][-1]
+            if (round(green_area[pandas.notnull(values)][-1],10)==0. and
+                max(degree_days) >= date_end_sen+latency_after_inc):
+                before_end = degree_days<date_end_sen+latency_after_inc
+                data = values[before_end]
+                ddays = degree_days[before_end]
+                infected = data>0
+                if infected.any():
+                    audpc = simps(data[infected], ddays[infected])
+                    if numpy.isnan(audpc):
+                        audpc = trapz(data[infected], ddays[infected])
                 else:
-                    self.data.loc[ind_data_lf, 'audpc_long'] = np.nan
+                    audpc = 0.
+                self.data.loc[ind_data_lf, 'audpc_long'] = audpc
+            else:
+                self.data.loc[ind_data_lf, 'audpc_long'] = np.nan
                     
     def post_treatment(self, variety = None):
-        self.data = self.data[~pandas.isnull(self.data['date'])]
+        self.gather_data()
         self.add_leaf_numbers()
-        self.leaf_senesced_area()
-        self.leaf_necrotic_area()
-        self.leaf_necrotic_area_on_green()
-        self.leaf_disease_area()
-        self.ratios()
-        self.severity()
-        self.severity_on_green()
+        self.leaf_derived_columns()
         self.get_audpc()
         self.get_audpc_long()
         if variety is not None:
@@ -1092,9 +1245,8 @@ class AdelSeptoRecorder(AdelWheatRecorder):
 def get_recorder(*filenames):
     recorder = []
     for file in filenames:
-        f_rec = open(file)
-        recorder.append(pickle.load(f_rec))
-        f_rec.close()
+        with open(file, 'rb') as f_rec:
+            recorder.append(pickle.load(f_rec))
     return recorder if len(recorder)>1 else recorder[0]
 
 def get_date_threshold(data, variable = 'severity', 
@@ -1170,18 +1322,17 @@ class BrownRustRecorder(AdelWheatRecorder):
     """ Record simulation output on every leaf of main stems in a dataframe during simulation """
     def __init__(self, group_dus = True, 
                  fungus_name = 'brown_rust', 
-                 increment = 1000):
+                 increment = 1000, dtype = np.float64):
         super(BrownRustRecorder, self).__init__(group_dus = group_dus, 
                                                 fungus_name = fungus_name,
-                                                increment = increment)
+                                                increment = increment,
+                                                dtype = dtype)
         columns = ['date', 'degree_days', 'num_plant', 'num_leaf_bottom', 'leaf_area', 
                    'leaf_green_area', 'leaf_length', 'leaf_senesced_length', 'fnl', 
                    'nb_dispersal_units', 'nb_lesions',
                    'surface_sink', 'surface_chlo', 'surface_spo', 
                    'surface_empty', 'surface_dead']
-        self.data = pandas.DataFrame(data = [[np.nan for col in columns] 
-                                     for i in range(self.increment)],
-                                     columns = columns)
+        self.init_data(columns)
     
     def get_values_single_leaf(self, g, date, degree_days, id_list):
         dict_lf = {}
@@ -1194,13 +1345,13 @@ class BrownRustRecorder(AdelWheatRecorder):
         lengths = g.property('length')
         senesced_lengths = g.property('senesced_length')
         fnls = g.property('nff')
-        a_label_splitted = self.a_labels[id_list[0]].split('_')
-        dict_lf['num_plant'] = int(a_label_splitted[0].split('plant')[1])
-        dict_lf['num_leaf_bottom'] = int(a_label_splitted[2].split('metamer')[1])
-        dict_lf['leaf_area'] = sum([areas[id] for id in id_list])
-        dict_lf['leaf_green_area'] = sum([green_areas[id] for id in id_list])
-        dict_lf['leaf_length'] = sum([lengths[id] for id in id_list])
-        dict_lf['leaf_senesced_length'] = sum([senesced_lengths[id] for id in id_list])
+        num_plant, num_metamer = _ADEL_LABEL.match(self.a_labels[id_list[0]]).groups()
+        dict_lf['num_plant'] = int(num_plant)
+        dict_lf['num_leaf_bottom'] = int(num_metamer)
+        dict_lf['leaf_area'] = sum(areas[id] for id in id_list)
+        dict_lf['leaf_green_area'] = sum(green_areas[id] for id in id_list)
+        dict_lf['leaf_length'] = sum(lengths[id] for id in id_list)
+        dict_lf['leaf_senesced_length'] = sum(senesced_lengths[id] for id in id_list)
         dict_lf['fnl'] =  fnls[g.complex_at_scale(id_list[0], 2)]
 
         # Update properties of dispersal units and lesions
@@ -1212,20 +1363,23 @@ class BrownRustRecorder(AdelWheatRecorder):
         surface_empty = 0.
         surface_dead = 0.
         
+        fungus_name = self.fungus_name
+        group_dus = self.group_dus
+        dispersal_units = g.property('dispersal_units')
+        lesions = g.property('lesions')
         for id in id_list:
-            leaf = g.node(id)
-            if 'dispersal_units' in leaf.properties():
-                for du in leaf.dispersal_units:
-                    if du.fungus.name == self.fungus_name:
-                        if self.group_dus:
+            if id in dispersal_units:
+                for du in dispersal_units[id]:
+                    if du.fungus.name == fungus_name:
+                        if group_dus:
                             nb_dus += du.nb_dispersal_units
                         else:
                             nb_dus += 1
                                 
-            if 'lesions' in leaf.properties():
-                for les in leaf.lesions:
-                    if les.fungus.name == self.fungus_name:
-                        if self.group_dus:
+            if id in lesions:
+                for les in lesions[id]:
+                    if les.fungus.name == fungus_name:
+                        if group_dus:
                             nb_lesions += les.nb_lesions
                         else:
                             nb_lesions += 1
@@ -1261,20 +1415,14 @@ class BrownRustRecorder(AdelWheatRecorder):
                                          self.data['surface_empty']
 
     def add_max_leaf_green_area(self):
-        for ind in self.data.index:
-            df = self.data[(self.data['num_plant']==self.data['num_plant'][ind]) & \
-                            (self.data['num_leaf_bottom']==self.data['num_leaf_bottom'][ind])]
-            self.data.loc[ind,'max_leaf_green_area'] = df['leaf_green_area'].max()
+        leaves = self.data.groupby(['num_plant', 'num_leaf_bottom'])
+        self.data['max_leaf_green_area'] = leaves['leaf_green_area'].transform('max')
             
     def get_ratio(self, variable='surface_alive'):
-        output = []
-        df = self.data
-        for ind in df.index:
-            if round(df['leaf_area'][ind], 16)>0.:
-                output.append(self.data[variable][ind]/self.data['leaf_area'][ind])
-            else:
-                output.append(np.nan)
-        return output
+        a = self.data['leaf_area'].values
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(np.round(a, 16) > 0., 
+                            self.data[variable].values/a, np.nan)
 
     def ratios(self):
         if not 'max_leaf_green_area' in self.data.columns:
@@ -1294,34 +1442,9 @@ class BrownRustRecorder(AdelWheatRecorder):
     def add_variety(self, variety = None):
         self.data['variety'] = variety
         
-    def get_audpc(self, variable='severity'):
-        for pl in set(self.data['num_plant']):
-            df_pl =  self.data[self.data['num_plant'] == pl]
-            for lf in set(df_pl['num_leaf_top']):
-                df_lf = df_pl[df_pl['num_leaf_top'] == lf]
-                ind_data_lf = df_lf.index
-                if round(df_lf['leaf_green_area'][pandas.notnull(df_lf[variable])].iloc[-1],10)==0.:
-                    data = df_lf[variable][df_lf['leaf_green_area']>0]
-                    ddays = df_lf['degree_days'][df_lf['leaf_green_area']>0]
-                    data_ref = numpy.ones(len(data))
-                    if len(data[data>0])>0:
-                        audpc = simps(data[data>0], ddays[data>0])
-                        audpc_ref = simps(data_ref[data_ref>0], ddays[data_ref>0])
-                        if numpy.isnan(audpc):
-                            audpc = trapz(data[data>0], ddays[data>0])
-                        if numpy.isnan(audpc_ref):
-                            audpc_ref = trapz(data_ref[data_ref>0], ddays[data_ref>0])
-                    else:
-                        audpc = 0.
-                        audpc_ref = 0.
-                    self.data.loc[ind_data_lf, 'audpc'] = audpc
-                    self.data.loc[ind_data_lf, 'normalized_audpc'] = audpc/audpc_ref if audpc_ref>0. else 0.
-                else:
-                    self.data.loc[ind_data_lf, 'audpc'] = np.nan
-                    self.data.loc[ind_data_lf, 'normalized_audpc'] = np.nan  
     
     def post_treatment(self, variety = None):
-        self.data = self.data[~pandas.isnull(self.data['date'])]
+        self.gather_data()
         self.add_leaf_numbers()
         self.leaf_senesced_area()
         self.leaf_disease_area()
@@ -1378,16 +1501,16 @@ class SeptoRustRecorder(AdelWheatRecorder):
     """ Record simulation output on every leaf of main stems in a dataframe 
         during simulation of septoria and brown rust coupled epidemics """
     def __init__(self, group_dus = True, 
-                 increment = 1000):
+                 increment = 1000, dtype = np.float64):
         super(SeptoRustRecorder, self).__init__(group_dus = group_dus, 
-                                                increment = increment)
+                                                increment = increment,
+                                                dtype = dtype)
         columns = ['date', 'degree_days', 'num_plant', 'num_leaf_bottom', 
                    'fnl', 'leaf_area', 'leaf_green_area', 'nb_dus_septo',
                    'nb_dus_rust', 'nb_lesions_septo', 'nb_lesions_rust',
                    'surface_septo', 'surface_septo_spo', 
                    'surface_septo_on_green', 'surface_rust', 'severity_rust_spo']
-        self.data = pandas.DataFrame(data = [[np.nan for col in columns] for i in range(1000)], 
-                                     columns = columns)
+        self.init_data(columns)
     
     def get_values_single_leaf(self, g, date, degree_days, id_list):
         dict_lf = {}
@@ -1397,12 +1520,13 @@ class SeptoRustRecorder(AdelWheatRecorder):
         # Update leaf properties
         areas = g.property('area')
         green_areas = g.property('green_area')
+        senesced_lengths = g.property('senesced_length')
         fnls = g.property('nff')
-        a_label_splitted = self.a_labels[id_list[0]].split('_')
-        dict_lf['num_plant'] = int(a_label_splitted[0].split('plant')[1])
-        dict_lf['num_leaf_bottom'] = int(a_label_splitted[2].split('metamer')[1])
-        dict_lf['leaf_area'] = sum([areas[id] for id in id_list])
-        green_area =  sum([green_areas[id] for id in id_list])
+        num_plant, num_metamer = _ADEL_LABEL.match(self.a_labels[id_list[0]]).groups()
+        dict_lf['num_plant'] = int(num_plant)
+        dict_lf['num_leaf_bottom'] = int(num_metamer)
+        dict_lf['leaf_area'] = sum(areas[id] for id in id_list)
+        green_area =  sum(green_areas[id] for id in id_list)
         dict_lf['leaf_green_area'] = green_area
         dict_lf['fnl'] =  fnls[g.complex_at_scale(id_list[0], 2)]
 
@@ -1424,25 +1548,27 @@ class SeptoRustRecorder(AdelWheatRecorder):
         surface_rust_spo = 0.
         surface_rust_dead = 0.
         
+        group_dus = self.group_dus
+        dispersal_units = g.property('dispersal_units')
+        lesions = g.property('lesions')
         for id in id_list:
-            leaf = g.node(id)
-            if 'dispersal_units' in leaf.properties():
-                for du in leaf.dispersal_units:
+            if id in dispersal_units:
+                for du in dispersal_units[id]:
                     if du.fungus.name == 'septoria':
-                        if self.group_dus:
+                        if group_dus:
                             nb_dus_septo += du.nb_dispersal_units
                         else:
                             nb_dus_septo += 1
                     elif du.fungus.name == 'brown_rust':
-                        if self.group_dus:
+                        if group_dus:
                             nb_dus_rust += du.nb_dispersal_units
                         else:
                             nb_dus_rust += 1
                             
-            if 'lesions' in leaf.properties():
-                for les in leaf.lesions:
+            if id in lesions:
+                for les in lesions[id]:
                     if les.fungus.name == 'septoria':
-                        if self.group_dus:
+                        if group_dus:
                             nb_les = les.nb_lesions
                             nb_les_on_green = les.nb_lesions_non_sen
                             nb_lesions_septo += nb_les
@@ -1459,11 +1585,11 @@ class SeptoRustRecorder(AdelWheatRecorder):
                             nb_lesions_septo += 1
                             surface_septo_spo += (les.surface_spo + les.surface_empty)
                             surface_septo += les.surface_alive
-                            if les.position[0][0]>leaf.senesced_length:
+                            if les.position[0][0]>senesced_lengths[id]:
 #                                surface_septo_on_green += (les.surface_spo + les.surface_empty)
                                 surface_septo_on_green += les.surface_chlo + les.surface_nec + les.surface_spo + les.surface_empty
                     elif les.fungus.name == 'brown_rust':
-                        if self.group_dus:
+                        if group_dus:
                             nb_lesions_rust += les.nb_lesions
                         else:
                             nb_lesions_rust += 1
@@ -1506,23 +1632,23 @@ class SeptoRustRecorder(AdelWheatRecorder):
     def severity(self):
         if not 'leaf_disease_area' in self.data:
             self.leaf_disease_area()
-        self.data['severity'] = [self.data['leaf_disease_area'][ind]/self.data['leaf_area'][ind] if self.data['leaf_area'][ind]>0. else 0. for ind in self.data.index]
-        self.data['severity_septo'] = [self.data['surface_septo'][ind]/self.data['leaf_area'][ind] if self.data['leaf_area'][ind]>0. else 0. for ind in self.data.index]
-        self.data['severity_septo_spo'] = [self.data['surface_septo_spo'][ind]/self.data['leaf_area'][ind] if self.data['leaf_area'][ind]>0. else 0. for ind in self.data.index]
-        self.data['severity_rust'] = [self.data['surface_rust'][ind]/self.data['leaf_area'][ind] if self.data['leaf_area'][ind]>0. else 0. for ind in self.data.index]
+        self.data['severity'] = self._ratio('leaf_disease_area', 'leaf_area')
+        self.data['severity_septo'] = self._ratio('surface_septo', 'leaf_area')
+        self.data['severity_septo_spo'] = self._ratio('surface_septo_spo', 'leaf_area')
+        self.data['severity_rust'] = self._ratio('surface_rust', 'leaf_area')
     
     def severity_on_green(self):
         if not 'leaf_disease_area_on_green' in self.data:
             self.leaf_disease_area_on_green()
-        self.data['severity_on_green'] = [self.data['leaf_disease_area_on_green'][ind]/self.data['leaf_green_area'][ind] if self.data['leaf_green_area'][ind]>0. else 0. for ind in self.data.index]
-        self.data['severity_septo_on_green'] = [self.data['surface_septo_on_green'][ind]/self.data['leaf_green_area'][ind] if self.data['leaf_green_area'][ind]>0. else 0. for ind in self.data.index]
-        self.data['severity_rust_on_green'] = [self.data['surface_rust'][ind]/self.data['leaf_green_area'][ind] if self.data['leaf_green_area'][ind]>0. else 0. for ind in self.data.index]
+        self.data['severity_on_green'] = self._ratio('leaf_disease_area_on_green', 'leaf_green_area')
+        self.data['severity_septo_on_green'] = self._ratio('surface_septo_on_green', 'leaf_green_area')
+        self.data['severity_rust_on_green'] = self._ratio('surface_rust', 'leaf_green_area')
 
     def add_variety(self, variety = None):
         self.data['variety'] = variety
     
     def post_treatment(self, variety = None):
-        self.data = self.data[~pandas.isnull(self.data['date'])]
+        self.gather_data()
         self.add_variety(variety = variety)        
         self.add_leaf_numbers()
         self.leaf_senesced_area()
@@ -1545,7 +1671,7 @@ def variance(lst):
     """
     mu = numpy.mean(lst)
     if len(lst)>1:
-        return 1.0/(len(lst)-1) * sum([(i-mu)**2 for i in lst])
+        return 1.0/(len(lst)-1) * sum((i-mu)**2 for i in lst)
     else:
         return 0.
         
@@ -146,9 +146,12 @@ class SeptoriaRainDispersal:
                 nb_tri = len(norm[source])
                 borders = np.linspace(0,1,num=nb_tri)
                 
-                dus_by_tri = {k:filter(lambda x: borders[k]<x.position[0]<=borders[k+1], dus) 
-                                for k in range(nb_tri-1)
-                                if len(filter(lambda x: borders[k]<x.position[0]<=borders[k+1], dus))>0.}
+                dus_by_tri = {}
+                for k in range(nb_tri-1):
+                    dus_tri = [du for du in dus 
+                               if borders[k]<du.position[0]<=borders[k+1]]
+                    if len(dus_tri)>0:
+                        dus_by_tri[k] = dus_tri
                 
                 for k,v in dus_by_tri.iteritems():
                     source_normal = norm[source][k]
@@ -423,9 +426,6 @@ from alinea.popdrops.alep_interface import compute_overlaying
 import numpy as np
         
 class BrownRustDispersal:
-    import sys
-    sys.setrecursionlimit(10000)
-
     """ Calculate distribution of dispersal units in horizontal layers """
     def __init__(self, fungus = None,
                  group_dus = False,
@@ -471,16 +471,14 @@ class BrownRustDispersal:
             zs = [c[2] for c in centroids.itervalues()]
             minz = min(zs)
             maxz = max(zs) + self.layer_thickness
-            layers = {l:[] for l in np.arange(minz, maxz, self.layer_thickness)}
+            ls = np.arange(minz, maxz, self.layer_thickness)
+            layers = {l:[] for l in ls}
             
-            # Distribute leaves in layers
+            # Distribute leaves in layers (direct index of layer from height)
+            last_layer = len(ls) - 1
             for vid, coords in centroids.iteritems():
-                z = coords[2]
-                ls = layers.keys()
-                i_layer = np.where(map(lambda x: x<=z<x+self.layer_thickness 
-                                        if z!=maxz - self.layer_thickness
-                                        else x<=z<=x+self.layer_thickness , ls))[0]
-                if len(i_layer) > 0. and areas[vid]>1e-10:
+                i_layer = min(int((coords[2] - minz)/self.layer_thickness), last_layer)
+                if areas[vid]>1e-10:
                     layers[ls[i_layer]].append(vid)
             
             self.layers = layers
@@ -533,18 +531,23 @@ class BrownRustDispersal:
                         in dus_by_layer.iteritems() if nb_dus>0.}
                 
         def sum_nb(nb_leaves, nb_du):
-            if nb_leaves == 1:
-                return [nb_du]
-            elif nb_du == 0:
-                return [0] + sum_nb(nb_leaves-1, nb_du)
-            else:
-                nb_du_avg = float(nb_du/nb_leaves)
-                nb_du_sup = 2.*nb_du_avg
-                if nb_du_sup >= 1:
-                    nb_on_vid = int(round(max(0, min(nb_du, np.random.normal(nb_du_avg, nb_du_sup)))))
+            """ Distribute randomly nb_du between nb_leaves """
+            distribution = []
+            while nb_leaves > 1:
+                if nb_du == 0:
+                    nb_on_vid = 0
                 else:
-                    nb_on_vid = 1 if np.random.random()<nb_du_sup else 0
-                return [nb_on_vid] + sum_nb(nb_leaves-1, nb_du - nb_on_vid)
+                    nb_du_avg = float(nb_du/nb_leaves)
+                    nb_du_sup = 2.*nb_du_avg
+                    if nb_du_sup >= 1:
+                        nb_on_vid = int(round(max(0, min(nb_du, np.random.normal(nb_du_avg, nb_du_sup)))))
+                    else:
+                        nb_on_vid = 1 if np.random.random()<nb_du_sup else 0
+                distribution.append(nb_on_vid)
+                nb_du -= nb_on_vid
+                nb_leaves -= 1
+            distribution.append(nb_du)
+            return distribution
                 
         deposits = {}
         for source, nb_dus in dus_by_layer.iteritems():
@@ -584,11 +587,7 @@ class BrownRustDispersal:
                 du.set_nb_dispersal_units(nb_dispersal_units = nb_dus)
                 deposits[vid] = [du]
             else:
-                dus = []
-                for d in range(nb_dus):
-                    du = self.fungus.dispersal_unit(1)
-                    dus.append(du)
-                deposits[vid] = dus
+                deposits[vid] = self.fungus.dispersal_units(nb_dus)
         return deposits
 
     def plot_layers(self, g):
@@ -275,9 +275,10 @@ class Fungus(object):
         :Parameters:
          - 'kwds' (dict): keys and values for new parameters
         """
-        self.__dict__.update(kwds)
         if len(kwds)>0:
-            self.parameter_names += [k for k in kwds.iterkeys()]
+            self.__dict__.update(kwds)
+            self.parameter_names += [k for k in kwds.iterkeys() 
+                                     if k not in self.parameter_names]
         
     def parameters(self, **kwds):
         """ Get parameters of the fungus.
@@ -299,6 +300,18 @@ class Fungus(object):
         instance = self.DispersalUnit_class(mutable=mutable)
         return instance
 
+    def dispersal_units(self, nb_dispersal_units=1, mutable=False, **kwds):
+        """ Create a list of dispersal unit instances of the fungus.
+        
+        :Parameters:
+         - 'nb_dispersal_units' (int): number of instances to create
+         - 'kwds' (dict): keys and values for eventual new parameters
+        """
+        self.update_parameters(**kwds)
+        self.DispersalUnit_class.fungus = self
+        DU = self.DispersalUnit_class
+        return [DU(mutable=mutable) for i in range(nb_dispersal_units)]
+
     def lesion(self, mutable=False, **kwds):
         """ Create a lesion instance of the fungus.
         
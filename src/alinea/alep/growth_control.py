@@ -6,6 +6,86 @@
 # Imports #########################################################################
 import numpy as np
 import random as rd
+from math import exp
+from itertools import chain
+from alinea.alep.architecture import get_blade_leaves
+
+# Utilities #######################################################################
+def iter_blade_lesions(g, label='LeafElement'):
+    """ Iterate on the blades of the MTG that carry lesions.
+    
+    Parameters
+    ----------
+    g: MTG
+        MTG representing the canopy (and the soil)
+    label: str
+        Label of the part of the MTG concerned by the calculation
+    
+    Yields
+    ------
+    blade, leaf, leaf_lesions: 
+        Id of the blade, ids of its leaf elements and lesions on them
+    """
+    lesions = g.property('lesions')
+    for blade, leaf in get_blade_leaves(g, label=label):
+        if len(leaf) > 0:
+            leaf_lesions = list(chain.from_iterable(lesions.get(lf, ()) for lf in leaf))
+            if len(leaf_lesions) > 0:
+                yield blade, leaf, leaf_lesions
+
+def healthy_area(leaf, leaf_lesions, areas, green_areas, senesced_areas):
+    """ Area of the blade neither senescent nor covered by lesions.
+    """
+    les_surf = sum(les.surface for les in leaf_lesions)
+    leaf_area = sum(areas[lf] for lf in leaf)
+    leaf_green_area = sum(green_areas[lf] for lf in leaf)
+    leaf_senesced_area = sum(senesced_areas[lf] for lf in leaf)
+    ratio_green = min(1., leaf_green_area/leaf_area) if leaf_area>0. else 0.
+    green_lesion_area = les_surf * ratio_green if leaf_senesced_area > les_surf else les_surf - leaf_senesced_area
+    leaf_healthy_area = leaf_area - (leaf_senesced_area + green_lesion_area)
+    return max(0., round(leaf_healthy_area, 10))
+
+def true_area_impacted(nb_lesions, available_area, mean_lesion_size):
+    """ Area covered by nb_lesions circular lesions of mean size 
+        mean_lesion_size randomly placed (Poisson law) on available_area.
+    """
+    if available_area>0.:
+        return available_area*(1-min(1.,exp(-nb_lesions*mean_lesion_size/available_area)))
+    else:
+        return 0.
+
+def manage_senescence_border(leaf, r, lesions, senesced_lengths, lengths):
+    """ Move the senescence border on a blade so that only a ratio r of its 
+        non senescent length remains green, and notify lesions.
+    
+    Parameters
+    ----------
+    leaf: list
+        Ids of the leaf elements of the blade, from base to tip
+    r: float
+        Ratio of non senescent length to keep green
+    lesions: dict
+        Lesions on leaf elements (MTG property)
+    senesced_lengths: dict
+        Senesced lengths of leaf elements (MTG property), updated in place
+    lengths: dict
+        Lengths of leaf elements (MTG property)
+    """
+    s_ls = [senesced_lengths[lf] for lf in leaf]
+    s_l = sum(s_ls)
+    t_ls = [lengths[lf] for lf in leaf]
+    t_l = sum(t_ls)
+    new_length = t_l - r*(t_l - s_l)
+    idx = -1
+    while round(new_length,10) > 0:
+        n_l = min(t_ls[idx],new_length)
+        s_ls[idx] = n_l
+        new_length -= n_l
+        idx -= 1
+    for lf, s_l in zip(leaf, s_ls):
+        senesced_lengths[lf] = s_l
+        for l in lesions.get(lf, ()):
+            l.senescence_response(senesced_length=s_l)
 
 # With no priority between lesions ################################################
 class NoPriorityGrowthControl:
@@ -37,36 +117,22 @@ class NoPriorityGrowthControl:
         - Assert that leaf surface is not negative
         
         """       
-        lesions = {k:v for k,v in g.property('lesions').iteritems() if len(v)>0.}
         areas = g.property('area')
         green_areas = g.property('green_area')
         senesced_areas = g.property('senesced_area')
-        geom = g.property('geometry')
-        labels = g.property('label')
-        bids = (v for v,l in labels.iteritems() if l.startswith('blade'))
-        for blade in bids:
-            leaf = [vid for vid in g.components(blade) 
-                    if labels[vid].startswith(label) and vid in geom]
-            if len(leaf) > 0.:
-                leaf_lesions = sum([lesions[lf] for lf in leaf if lf in lesions], [])
-                les_surf = sum([les.surface for les in leaf_lesions])
-                leaf_area = sum([areas[lf] for lf in leaf])
-                leaf_green_area = sum([green_areas[lf] for lf in leaf])
-                leaf_senesced_area = sum([senesced_areas[lf] for lf in leaf])
-                ratio_green = min(1., leaf_green_area/leaf_area) if leaf_area>0. else 0.
-                green_lesion_area = les_surf * ratio_green if leaf_senesced_area > les_surf else les_surf - leaf_senesced_area
-                leaf_healthy_area = leaf_area - (leaf_senesced_area + green_lesion_area)
-                leaf_healthy_area = max(0., round(leaf_healthy_area, 10))
+        for blade, leaf, leaf_lesions in iter_blade_lesions(g, label=label):
+            leaf_healthy_area = healthy_area(leaf, leaf_lesions, areas, 
+                                             green_areas, senesced_areas)
 
-                total_demand = sum(l.growth_demand for l in leaf_lesions)
-                if total_demand > leaf_healthy_area:
-                    for l in leaf_lesions:
-                        growth_offer = round(leaf_healthy_area * l.growth_demand / total_demand, 14)
-                        l.control_growth(growth_offer=growth_offer)
-                else:
-                    for l in leaf_lesions:
-                        growth_offer = l.growth_demand
-                        l.control_growth(growth_offer = growth_offer)
+            total_demand = sum(l.growth_demand for l in leaf_lesions)
+            if total_demand > leaf_healthy_area:
+                scale = leaf_healthy_area / total_demand
+                for l in leaf_lesions:
+                    growth_offer = round(l.growth_demand * scale, 14)
+                    l.control_growth(growth_offer=growth_offer)
+            else:
+                for l in leaf_lesions:
+                    l.control_growth(l.growth_demand)
 
 class PriorityGrowthControl:
     """ 
@@ -74,52 +140,38 @@ class PriorityGrowthControl:
     def control(self, g, label='LeafElement'):
         """ 
         """
-        lesions = {k:v for k,v in g.property('lesions').iteritems() if len(v)>0.}
         areas = g.property('area')
         green_areas = g.property('green_area')
         senesced_areas = g.property('senesced_area')
-        labels = g.property('label')
-        geom = g.property('geometry')
 
         # Select all the leaves
-        bids = (v for v,l in labels.iteritems() if l.startswith('blade'))
-        for blade in bids:
-            leaf = [vid for vid in g.components(blade) 
-                    if labels[vid].startswith(label) and vid in geom]
-            if len(leaf) > 0.:
-                leaf_lesions = sum([lesions[lf] for lf in leaf if lf in lesions], []) 
-                les_surf = sum([les.surface for les in leaf_lesions])
-                leaf_area = sum([areas[lf] for lf in leaf])
-                leaf_green_area = sum([green_areas[lf] for lf in leaf])
-                leaf_senesced_area = sum([senesced_areas[lf] for lf in leaf])
-                ratio_green = min(1., leaf_green_area/leaf_area) if leaf_area>0. else 0.
-                green_lesion_area = les_surf * ratio_green if leaf_senesced_area > les_surf else les_surf - leaf_senesced_area
-                leaf_healthy_area = leaf_area - (leaf_senesced_area + green_lesion_area)
-                leaf_healthy_area = max(0., round(leaf_healthy_area, 10))   
-                total_demand = sum(l.growth_demand for l in leaf_lesions)
-                if total_demand > leaf_healthy_area:
-                    prior_lesions = [l for l in leaf_lesions if l.status>=l.fungus.CHLOROTIC]
-                    non_prior_lesions = [l for l in leaf_lesions if l.status<l.fungus.CHLOROTIC]
-                    prior_demand = sum(l.growth_demand for l in prior_lesions)
-                    if prior_demand > leaf_healthy_area:
-                        for l in non_prior_lesions:
-                            l.control_growth(growth_offer=0.)
-                        for l in prior_lesions:
-                            growth_offer = round(leaf_healthy_area * l.growth_demand / prior_demand, 14)
-                            l.control_growth(growth_offer=growth_offer)
-                    else:
-                        for l in prior_lesions:
-                            growth_offer = l.growth_demand
-                            l.control_growth(growth_offer=growth_offer)
-                        non_prior_demand = sum(l.growth_demand for l in non_prior_lesions)
-                        assert non_prior_demand >= (leaf_healthy_area-prior_demand)
-                        for l in non_prior_lesions:
-                            growth_offer = round((leaf_healthy_area-prior_demand) * l.growth_demand / non_prior_demand, 14)
-                            l.control_growth(growth_offer=growth_offer)
+        for blade, leaf, leaf_lesions in iter_blade_lesions(g, label=label):
+            leaf_healthy_area = healthy_area(leaf, leaf_lesions, areas, 
+                                             green_areas, senesced_areas)
+            total_demand = sum(l.growth_demand for l in leaf_lesions)
+            if total_demand > leaf_healthy_area:
+                prior_lesions = [l for l in leaf_lesions if l.status>=l.fungus.CHLOROTIC]
+                non_prior_lesions = [l for l in leaf_lesions if l.status<l.fungus.CHLOROTIC]
+                prior_demand = sum(l.growth_demand for l in prior_lesions)
+                if prior_demand > leaf_healthy_area:
+                    for l in non_prior_lesions:
+                        l.control_growth(growth_offer=0.)
+                    scale = leaf_healthy_area / prior_demand
+                    for l in prior_lesions:
+                        growth_offer = round(l.growth_demand * scale, 14)
+                        l.control_growth(growth_offer=growth_offer)
                 else:
-                    for l in leaf_lesions:
-                        growth_offer = l.growth_demand
+                    for l in prior_lesions:
+                        l.control_growth(l.growth_demand)
+                    non_prior_demand = sum(l.growth_demand for l in non_prior_lesions)
+                    assert non_prior_demand >= (leaf_healthy_area-prior_demand)
+                    scale = (leaf_healthy_area-prior_demand) / non_prior_demand
+                    for l in non_prior_lesions:
+                        growth_offer = round(l.growth_demand * scale, 14)
                         l.control_growth(growth_offer=growth_offer)
+            else:
+                for l in leaf_lesions:
+                    l.control_growth(l.growth_demand)
 
 class GrowthControlVineLeaf:
     """ Class for growth control used when the phyto-element is a vine leaf.
@@ -145,7 +197,8 @@ class GrowthControlVineLeaf:
         labels = g.property('label')
         
         # Select all the leaves
-        vids = (v for v,l in labels.iteritems() if l.startswith(label))
+        nb_chars = len(label)
+        vids = (v for v,l in labels.iteritems() if l[:nb_chars]==label)
         for leaf in vids:
             try:
                 leaf_healthy_area = healthy_areas[leaf]
@@ -162,8 +215,7 @@ class GrowthControlVineLeaf:
                     l.control_growth(growth_offer=growth_offer)
             else:
                 for l in leaf_lesions:
-                    growth_offer = l.growth_demand
-                    l.control_growth(growth_offer=growth_offer)
+                    l.control_growth(l.growth_demand)
 
 # Geometric competition with circular lesions #################################
 class GeometricPoissonCompetition:
@@ -174,82 +226,58 @@ class GeometricPoissonCompetition:
     
     """    
     def true_area_impacted(self, nb_lesions, available_area, mean_lesion_size):
-        if available_area>0.:
-            return available_area*(1-np.minimum(1.,np.exp(-nb_lesions*mean_lesion_size/available_area)))
-        else:
-            return 0.
-        
+        return true_area_impacted(nb_lesions, available_area, mean_lesion_size)
+    
     def manage_senescence_border(self, leaf, r, lesions, 
                                  senesced_lengths, lengths):
-        s_ls = [senesced_lengths[lf] for lf in leaf]
-        s_l = sum(s_ls)
-        t_ls = [lengths[lf] for lf in leaf]
-        t_l = sum(t_ls)
-        new_length = t_l - r*(t_l - s_l)
-        idx = -1
-        while round(new_length,10) > 0:
-            n_l = min(t_ls[idx],new_length)
-            s_ls[idx] = n_l
-            new_length -= n_l
-            idx -= 1
-        senesced_lengths.update({lf:s_ls[i] for i,lf in enumerate(leaf)})
-        for lf in leaf:
-            if lf in lesions:
-                for l in lesions[lf]:
-                    l.senescence_response(senesced_length=senesced_lengths[lf])
+        manage_senescence_border(leaf, r, lesions, senesced_lengths, lengths)
     
     def control(self, g, label='LeafElement'):
         """ Limit lesion growth to healthy area on leaves and simulate 
             congestion between circular lesions.
         """       
-        lesions = {k:v for k,v in g.property('lesions').iteritems() if len(v)>0.}
+        lesions = g.property('lesions')
         green_areas = g.property('green_area')
-        geom = g.property('geometry')
-        labels = g.property('label')
         lengths = g.property('length')
         areas = g.property('area')
         senesced_lengths = g.property('senesced_length')
-        bids = (v for v,l in labels.iteritems() if l.startswith('blade'))
-        for blade in bids:
-            leaf = [vid for vid in g.components(blade) 
-                    if labels[vid].startswith(label) and vid in geom]
-            if len(leaf) > 0:
-                leaf_lesions = sum([lesions[lf] for lf in leaf if lf in lesions], [])
-                nb_lesions = sum([les.nb_lesions_non_sen for les in leaf_lesions])
-                if nb_lesions>0.:
-                    les_surf = 0.
-                    pot_les_surf = 0.
-                    les_surf_non_sen = 0.
-                    total_demand = 0.
-                    for les in leaf_lesions:
-                        les_surf += les.surface
-                        pot_les_surf += les.potential_surface
-                        les_surf_non_sen += les.surface_non_senescent
-                        total_demand += les.growth_demand
-                    leaf_green_area = sum([green_areas[lf] for lf in leaf])
-                    leaf_area = sum([areas[lf] for lf in leaf])
-                    if round(les_surf_non_sen,16) < round(leaf_green_area, 16):
-                        true_area = self.true_area_impacted(nb_lesions, 
-                                                            leaf_green_area, 
-                                                            pot_les_surf/nb_lesions)
+        for blade, leaf, leaf_lesions in iter_blade_lesions(g, label=label):
+            nb_lesions = 0.
+            les_surf = 0.
+            pot_les_surf = 0.
+            les_surf_non_sen = 0.
+            total_demand = 0.
+            for les in leaf_lesions:
+                nb_lesions += les.nb_lesions_non_sen
+                les_surf += les.surface
+                pot_les_surf += les.potential_surface
+                les_surf_non_sen += les.surface_non_senescent
+                total_demand += les.growth_demand
+            if nb_lesions>0.:
+                leaf_green_area = sum(green_areas[lf] for lf in leaf)
+                leaf_area = sum(areas[lf] for lf in leaf)
+                if round(les_surf_non_sen,16) < round(leaf_green_area, 16):
+                    true_area = true_area_impacted(nb_lesions, 
+                                                   leaf_green_area, 
+                                                   pot_les_surf/nb_lesions)
 
-                        offer = min(leaf_area-les_surf, true_area - les_surf_non_sen)
-                    else:
-                        offer = 0
-                        r = leaf_green_area / les_surf_non_sen
-                        if round(r,14) < 1:
-                            self.manage_senescence_border(leaf, r, lesions,
-                                                          senesced_lengths,
-                                                          lengths)
+                    offer = min(leaf_area-les_surf, true_area - les_surf_non_sen)
+                else:
+                    offer = 0
+                    r = leaf_green_area / les_surf_non_sen
+                    if r < 1. - 5e-15:
+                        manage_senescence_border(leaf, r, lesions,
+                                                 senesced_lengths, lengths)
 
-                    if offer > 0:
-                        for l in leaf_lesions:
-                            growth_offer = l.growth_demand * offer/total_demand if total_demand>0. else 0.
-                            l.control_growth(growth_offer = growth_offer)
-                    else:
-                        for l in leaf_lesions:
-                            growth_offer = offer*les.surface/les_surf
-                            l.control_growth(growth_offer = growth_offer)
+                if offer > 0:
+                    scale = offer/total_demand if total_demand>0. else 0.
+                    for l in leaf_lesions:
+                        growth_offer = l.growth_demand * scale
+                        l.control_growth(growth_offer = growth_offer)
+                else:
+                    for l in leaf_lesions:
+                        growth_offer = offer*les.surface/les_surf
+                        l.control_growth(growth_offer = growth_offer)
 
 # Growth control between 2 diseases ###########################################
 class SeptoRustCompetition:
@@ -260,157 +288,131 @@ class SeptoRustCompetition:
         self.disease_area=0.
     
     def true_area_impacted(self, nb_lesions, available_area, mean_lesion_size):
-        if available_area>0.:
-            return available_area*(1-np.minimum(1.,np.exp(-nb_lesions*mean_lesion_size/available_area)))
-        else:
-            return 0.
+        return true_area_impacted(nb_lesions, available_area, mean_lesion_size)
     
     def manage_senescence_border(self, leaf, r, lesions, 
                                  senesced_lengths, lengths):
-        s_ls = [senesced_lengths[lf] for lf in leaf]
-        s_l = sum(s_ls)
-        t_ls = [lengths[lf] for lf in leaf]
-        t_l = sum(t_ls)
-        new_length = t_l - r*(t_l - s_l)
-        idx = -1
-        while round(new_length,10) > 0:
-            n_l = min(t_ls[idx],new_length)
-            s_ls[idx] = n_l
-            new_length -= n_l
-            idx -= 1
-        senesced_lengths.update({lf:s_ls[i] for i,lf in enumerate(leaf)})
-        for lf in leaf:
-            if lf in lesions:
-                for l in lesions[lf]:
-                    l.senescence_response(senesced_length=senesced_lengths[lf])
+        manage_senescence_border(leaf, r, lesions, senesced_lengths, lengths)
     
     def control(self, g, label = 'LeafElement'):
         """ Model of competition. 
         
         TODO : Review: lots of limit cases, difficult to understand. Aaaaargh
         """
-        lesions = {k:v for k,v in g.property('lesions').iteritems() if len(v)>0.}
+        lesions = g.property('lesions')
         areas = g.property('area')
         green_areas = g.property('green_area')
-        labels = g.property('label')
-        geom = g.property('geometry')
         lengths = g.property('length')
-        areas = g.property('area')
         senesced_lengths = g.property('senesced_length')
-        bids = (v for v,l in labels.iteritems() if l.startswith('blade'))
         
         # Temp
 #        from alinea.adel.newmtg import adel_labels
 #        a_labs = adel_labels(g)
 #        ages = g.property('age')
         
-        for blade in bids:
-            leaf = [vid for vid in g.components(blade) 
-                    if labels[vid].startswith(label) and vid in geom]
-            if len(leaf) > 0:
-                leaf_lesions = sum([lesions[lf] for lf in leaf if lf in lesions], [])
-                leaf_area = sum([areas[lf] for lf in leaf])
-                leaf_green_area = sum([green_areas[lf] for lf in leaf])
-                s_prio = 0.
-                s_non_prio = 0.
-                s_prio_alive = 0.
-                s_non_prio_alive = 0.
-                s_prio_non_sen = 0.
-                s_non_prio_non_sen = 0.
-                s_pot_prio = 0.
-                s_pot_non_prio = 0.
-                demand_prio = 0.
-                demand_non_prio = 0.
-                offer_prio = 0.
-                offer_non_prio = 0.
-                prio_les = []
-                non_prio_les = []
-                nb_prio = 0.
-                nb_non_prio = 0.
-                nb_rust = 0.
-                s_rust_non_sen = 0.
-                for l in leaf_lesions:
-                    if l.fungus.name=='septoria' and l.status >= l.fungus.CHLOROTIC:
-                        s_prio += l.surface
-                        s_prio_alive += l.surface_alive
-                        s_prio_non_sen += l.surface_non_senescent
-                        s_pot_prio += l.potential_surface
-                        prio_les.append(l)
-                        demand_prio += l.growth_demand
-                        nb_prio += l.nb_lesions_non_sen
-                    else:
-                        s_non_prio += l.surface
-                        s_non_prio_alive += l.surface_alive
-                        s_non_prio_non_sen += l.surface_non_senescent
-                        s_pot_non_prio += l.potential_surface
-                        non_prio_les.append(l)
-                        demand_non_prio += l.growth_demand
-                        nb_non_prio += l.nb_lesions_non_sen
-                        if l.fungus.name=='brown_rust':
-                            nb_rust += l.nb_lesions_non_sen
-                            s_rust_non_sen += l.surface_non_senescent
-                
-                if nb_prio>0:
-                    if round(s_prio_non_sen, 16) < round(leaf_green_area, 16):
-                        true_area_prio = self.true_area_impacted(nb_prio,
-                                                                 leaf_green_area,
-                                                                 s_pot_prio/nb_prio)  
-                        if leaf_green_area==leaf_area:
-                            offer_prio = min(leaf_area-s_prio_non_sen, true_area_prio - s_prio_non_sen)
-                        elif leaf_area > s_prio:
-                            offer_prio = min(leaf_area-s_prio, true_area_prio - s_prio_non_sen)
-                        else:
-                            offer_prio = 0.                            
+        for blade, leaf, leaf_lesions in iter_blade_lesions(g, label=label):
+            leaf_area = sum(areas[lf] for lf in leaf)
+            leaf_green_area = sum(green_areas[lf] for lf in leaf)
+            s_prio = 0.
+            s_non_prio = 0.
+            s_prio_alive = 0.
+            s_non_prio_alive = 0.
+            s_prio_non_sen = 0.
+            s_non_prio_non_sen = 0.
+            s_pot_prio = 0.
+            s_pot_non_prio = 0.
+            demand_prio = 0.
+            demand_non_prio = 0.
+            offer_prio = 0.
+            offer_non_prio = 0.
+            prio_les = []
+            non_prio_les = []
+            nb_prio = 0.
+            nb_non_prio = 0.
+            nb_rust = 0.
+            s_rust_non_sen = 0.
+            for l in leaf_lesions:
+                fungus = l.fungus
+                fungus_name = fungus.name
+                if fungus_name=='septoria' and l.status >= fungus.CHLOROTIC:
+                    s_prio += l.surface
+                    s_prio_alive += l.surface_alive
+                    s_prio_non_sen += l.surface_non_senescent
+                    s_pot_prio += l.potential_surface
+                    prio_les.append(l)
+                    demand_prio += l.growth_demand
+                    nb_prio += l.nb_lesions_non_sen
+                else:
+                    s_non_prio += l.surface
+                    s_non_prio_alive += l.surface_alive
+                    s_non_prio_non_sen += l.surface_non_senescent
+                    s_pot_non_prio += l.potential_surface
+                    non_prio_les.append(l)
+                    demand_non_prio += l.growth_demand
+                    nb_non_prio += l.nb_lesions_non_sen
+                    if fungus_name=='brown_rust':
+                        nb_rust += l.nb_lesions_non_sen
+                        s_rust_non_sen += l.surface_non_senescent
+            
+            if nb_prio>0:
+                if round(s_prio_non_sen, 16) < round(leaf_green_area, 16):
+                    true_area_prio = true_area_impacted(nb_prio,
+                                                        leaf_green_area,
+                                                        s_pot_prio/nb_prio)  
+                    if leaf_green_area==leaf_area:
+                        offer_prio = min(leaf_area-s_prio_non_sen, true_area_prio - s_prio_non_sen)
+                    elif leaf_area > s_prio:
+                        offer_prio = min(leaf_area-s_prio, true_area_prio - s_prio_non_sen)
                     else:
-                        offer_prio = 0.
-                        r = leaf_green_area / s_prio_non_sen if s_non_prio_non_sen>0 else 0.
-                        if round(r,14) < 1:
-                            self.manage_senescence_border(leaf, r, lesions,
-                                                          senesced_lengths,
-                                                          lengths)
+                        offer_prio = 0.                            
+                else:
+                    offer_prio = 0.
+                    r = leaf_green_area / s_prio_non_sen if s_non_prio_non_sen>0 else 0.
+                    if r < 1. - 5e-15:
+                        manage_senescence_border(leaf, r, lesions,
+                                                 senesced_lengths, lengths)
 
-                    offer_prio = max(0., min(offer_prio, demand_prio))
-                    for l in prio_les:
-                        offer_lesion = l.growth_demand*offer_prio/demand_prio if demand_prio>0. else 0.
-                        l.control_growth(offer_lesion)
-                        # Temp : Add limiting factor on sporulating capacity of septoria
-                        # print "l.377 growth_control modif"
-                        # if nb_rust>0:
-                            # l.sporulating_capacity = s_rust_non_sen/leaf_green_area if leaf_green_area>0. else 0.
+                offer_prio = max(0., min(offer_prio, demand_prio))
+                for l in prio_les:
+                    offer_lesion = l.growth_demand*offer_prio/demand_prio if demand_prio>0. else 0.
+                    l.control_growth(offer_lesion)
+                    # Temp : Add limiting factor on sporulating capacity of septoria
+                    # print "l.377 growth_control modif"
+                    # if nb_rust>0:
+                        # l.sporulating_capacity = s_rust_non_sen/leaf_green_area if leaf_green_area>0. else 0.
 
-                if nb_non_prio>0:
-                    nb_les = nb_prio + nb_non_prio
-                    s_pot = s_pot_non_prio + s_pot_prio
-                    if round(s_non_prio_non_sen, 16) < round(leaf_green_area, 16):
-                        true_area_non_prio = self.true_area_impacted(nb_les,
-                                                                     leaf_green_area, 
-                                                                     s_pot/nb_les)
-                        new_true_area_prio = s_prio_alive+offer_prio
-                        offer_non_prio = min(leaf_area-s_non_prio,
-                                             true_area_non_prio-s_non_prio_non_sen-new_true_area_prio)
-                    else:
-                        offer_non_prio = 0.
-                        r = leaf_green_area / s_non_prio_non_sen if s_non_prio_non_sen>0 else 0.
-                        if round(r,14) < 1:
-                            self.manage_senescence_border(leaf, r, lesions,
-                                                          senesced_lengths,
-                                                          lengths)
+            if nb_non_prio>0:
+                nb_les = nb_prio + nb_non_prio
+                s_pot = s_pot_non_prio + s_pot_prio
+                if round(s_non_prio_non_sen, 16) < round(leaf_green_area, 16):
+                    true_area_non_prio = true_area_impacted(nb_les,
+                                                            leaf_green_area, 
+                                                            s_pot/nb_les)
+                    new_true_area_prio = s_prio_alive+offer_prio
+                    offer_non_prio = min(leaf_area-s_non_prio,
+                                         true_area_non_prio-s_non_prio_non_sen-new_true_area_prio)
+                else:
+                    offer_non_prio = 0.
+                    r = leaf_green_area / s_non_prio_non_sen if s_non_prio_non_sen>0 else 0.
+                    if r < 1. - 5e-15:
+                        manage_senescence_border(leaf, r, lesions,
+                                                 senesced_lengths, lengths)
 
-                    if leaf_green_area<leaf_area:
-                        max_offer = max(0, leaf_green_area - s_non_prio - s_prio_alive - offer_prio)
-                        offer_non_prio = min(offer_non_prio, max_offer)
-                    
-                    if offer_non_prio>0:
-                        offers = 0.
-                        if offer_non_prio > demand_non_prio:
-                            offer_non_prio = demand_non_prio
-                        for l in non_prio_les:
-                            offer_lesion = l.growth_demand * offer_non_prio/demand_non_prio if demand_non_prio>0. else 0.
-                            offers += offer_lesion
-                            l.control_growth(offer_lesion)
-                    else:
-                        offer_non_prio = max(offer_non_prio, -s_non_prio_non_sen)
-                        offer_non_prio = max(offer_non_prio, -offer_prio)
-                        for l in non_prio_les:
-                            offer_lesion = offer_non_prio*l.surface_non_senescent/s_non_prio_non_sen if s_non_prio_non_sen>0. else 0.                        
-                            l.control_growth(growth_offer=offer_lesion)
+                if leaf_green_area<leaf_area:
+                    max_offer = max(0, leaf_green_area - s_non_prio - s_prio_alive - offer_prio)
+                    offer_non_prio = min(offer_non_prio, max_offer)
+                
+                if offer_non_prio>0:
+                    offers = 0.
+                    if offer_non_prio > demand_non_prio:
+                        offer_non_prio = demand_non_prio
+                    for l in non_prio_les:
+                        offer_lesion = l.growth_demand * offer_non_prio/demand_non_prio if demand_non_prio>0. else 0.
+                        offers += offer_lesion
+                        l.control_growth(offer_lesion)
+                else:
+                    offer_non_prio = max(offer_non_prio, -s_non_prio_non_sen)
+                    offer_non_prio = max(offer_non_prio, -offer_prio)
+                    for l in non_prio_les:
+                        offer_lesion = offer_non_prio*l.surface_non_senescent/s_non_prio_non_sen if s_non_prio_non_sen>0. else 0.                        
+                        l.control_growth(growth_offer=offer_lesion)
@@ -5,6 +5,8 @@
 
 # Imports #########################################################################
 import numpy as np
+from itertools import chain
+from alinea.alep.architecture import get_blade_leaves
 
 import collections        
 def is_iterable(obj):
@@ -53,10 +55,7 @@ class BiotrophDUProbaModel:
         g: MTG
             Updated MTG representing the canopy
         """
-        labels = g.property('label')
-        bids = (v for v,l in labels.iteritems() if l.startswith('blade'))
         DUs = g.property('dispersal_units')
-        dispersal_units = {k:v for k,v in DUs.iteritems() if len(v)>0.}
         areas = g.property('area')
         green_areas = g.property('green_area')
         lesions = g.property('lesions')
@@ -70,41 +69,48 @@ class BiotrophDUProbaModel:
         else: 
             fungi = self.fungus        
         
-        for blade in bids:
-            leaf = [vid for vid in g.components(blade) if labels[vid].startswith(label)]
-            leaf_lesions = sum([lesions[lf] for lf in leaf if lf in lesions], [])
-            les_surf = sum([les.surface for les in leaf_lesions])
-            leaf_area = sum([areas[lf] for lf in leaf])
-            leaf_green_area = sum([green_areas[lf] for lf in leaf])
-            ratio_les_surface = min(1, round(les_surf,3)/round(leaf_area,3)) if round(leaf_area,3)>0. else 0.
-            ratio_green = min(1, round(leaf_green_area,3)/round(leaf_area,3)) if round(leaf_area,3)>0. else 0.
+        for blade, leaf in get_blade_leaves(g, label=label, with_geometry=False):
+            leaf_lesions = list(chain.from_iterable(lesions.get(lf, ()) for lf in leaf))
+            les_surf = sum(les.surface for les in leaf_lesions)
+            leaf_area = sum(areas[lf] for lf in leaf)
+            leaf_green_area = sum(green_areas[lf] for lf in leaf)
+            rounded_area = round(leaf_area,3)
+            if rounded_area > 0.:
+                ratio_les_surface = min(1, round(les_surf,3)/rounded_area)
+                ratio_green = min(1, round(leaf_green_area,3)/rounded_area)
+            else:
+                ratio_les_surface = 0.
+                ratio_green = 0.
             lesion_density_by_fungus = {}
             for fungus in fungi:
-                nb_lesions = sum([les.nb_lesions for les in leaf_lesions if les.fungus.name==fungus])
+                nb_lesions = sum(les.nb_lesions for les in leaf_lesions if les.fungus.name==fungus)
                 lesion_density_by_fungus[fungus] = nb_lesions/leaf_area if leaf_area>0 else 0.
 
 
             if round(ratio_green*(1-ratio_les_surface), 10) == 0.:
-                for vid in set(leaf) & set(dispersal_units):
+                for vid in [lf for lf in leaf if DUs.get(lf)]:
                     DUs[vid] = []
-                    dispersal_units[vid] = []
             else:
-#                if blade==42 and g.node(leaf[0]).dd_sequence[0]>384.:
-#                    import pdb
-#                    pdb.set_trace()
-#                
-                for vid in set(leaf) & set(dispersal_units):
+                # Temp
+                age_lim = 50.
+                young_blade = self.age_infection and blade in ages and ages[blade]<age_lim
+                #
+                for vid in [lf for lf in leaf if DUs.get(lf)]:
                     all_deposit = []
+                    deposited = {fungus:[] for fungus in fungi}
+                    emitted = {fungus:[] for fungus in fungi}
+                    for du in DUs[vid]:
+                        if du.is_active:
+                            fungus_name = du.fungus.name
+                            if fungus_name in deposited:
+                                status = du.status
+                                if status == 'deposited':
+                                    deposited[fungus_name].append(du)
+                                elif status == 'emitted':
+                                    emitted[fungus_name].append(du)
                     for fungus in fungi:
-                        dus_to_keep = []
-                        dus = []
-                        for du in dispersal_units[vid]:
-                            if du.is_active and du.fungus.name==fungus:
-                                if du.status == 'deposited':
-                                    dus_to_keep.append(du)
-                                elif du.status == 'emitted':
-                                    dus.append(du)
-                            
+                        dus_to_keep = deposited[fungus]
+                        dus = emitted[fungus]
                         if len(dus)>0.:
                             group_dus = dus[0].fungus.group_dus
                             if group_dus == True:
@@ -112,15 +118,11 @@ class BiotrophDUProbaModel:
                             else:
                                 total_nb_dus = len(dus)
 #                                nb_on_healthy = int(total_nb_dus*ratio_green*(1-ratio_les_surface))
-                            nb_on_healthy = int(total_nb_dus*ratio_green)
-                            if lesion_density_by_fungus[fungus]>=self.max_lesion_density:
+                            if (young_blade or 
+                                lesion_density_by_fungus[fungus]>=self.max_lesion_density):
                                 nb_on_healthy = 0.
-                            
-                            # Temp
-                            age_lim = 50.
-                            if self.age_infection and blade in ages and ages[blade]<age_lim:
-                                nb_on_healthy *= 0.
-                            #
+                            else:
+                                nb_on_healthy = int(total_nb_dus*ratio_green)
                                 
                             if nb_on_healthy > 0:
                                 if group_dus == True:
@@ -136,7 +138,3 @@ class BiotrophDUProbaModel:
                         else:
                             all_deposit += dus_to_keep
                     DUs[vid] = all_deposit
-                    dispersal_units[vid] = all_deposit
-#                    if len(all_deposit)>0:
-#                        import pdb
-#                        pdb.set_trace()
\ No newline at end of file
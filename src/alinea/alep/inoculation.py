@@ -242,17 +242,14 @@ class AirborneContamination:
             zs = [c[2] for c in centroids.itervalues()]
             minz = min(zs)
             maxz = max(zs) + self.layer_thickness
-            layers = {l:[] for l in np.arange(minz, maxz, self.layer_thickness)}
+            ls = np.arange(minz, maxz, self.layer_thickness)
+            layers = {l:[] for l in ls}
             
-            # Distribute leaves in layers
+            # Distribute leaves in layers (direct index of layer from height)
+            last_layer = len(ls) - 1
             for vid, coords in centroids.iteritems():
-                z = coords[2]
-                ls = layers.keys()
-                i_layer = np.where(map(lambda x: x<=z<x+self.layer_thickness 
-                                        if z!=maxz - self.layer_thickness
-                                        else x<=z<=x+self.layer_thickness , ls))[0]
-                if len(i_layer) > 0.:
-                    layers[ls[i_layer]].append(vid)
+                i_layer = min(int((coords[2] - minz)/self.layer_thickness), last_layer)
+                layers[ls[i_layer]].append(vid)
             
             self.layers = layers
         else:
@@ -268,18 +265,23 @@ class AirborneContamination:
                     label='LeafElement', domain_area=None, **kwds):
                         
         def sum_nb(nb_leaves, nb_du):
-            if nb_leaves == 1:
-                return [nb_du]
-            elif nb_du == 0:
-                return [0] + sum_nb(nb_leaves-1, nb_du)
-            else:
-                nb_du_avg = float(nb_du/nb_leaves)
-                nb_du_sup = 2.*nb_du_avg
-                if nb_du_sup >= 1:
-                    nb_on_vid = int(round(max(0, min(nb_du, np.random.normal(nb_du_avg, nb_du_sup)))))
+            """ Distribute randomly nb_du between nb_leaves """
+            distribution = []
+            while nb_leaves > 1:
+                if nb_du == 0:
+                    nb_on_vid = 0
                 else:
-                    nb_on_vid = 1 if np.random.random()<nb_du_sup else 0
-                return [nb_on_vid] + sum_nb(nb_leaves-1, nb_du - nb_on_vid)
+                    nb_du_avg = float(nb_du/nb_leaves)
+                    nb_du_sup = 2.*nb_du_avg
+                    if nb_du_sup >= 1:
+                        nb_on_vid = int(round(max(0, min(nb_du, np.random.normal(nb_du_avg, nb_du_sup)))))
+                    else:
+                        nb_on_vid = 1 if np.random.random()<nb_du_sup else 0
+                distribution.append(nb_on_vid)
+                nb_du -= nb_on_vid
+                nb_leaves -= 1
+            distribution.append(nb_du)
+            return distribution
         
         if domain_area is None:
             domain_area = self.domain_area
@@ -307,11 +309,7 @@ class AirborneContamination:
                 du.set_nb_dispersal_units(nb_dispersal_units = nb_dus)
                 deposits[vid] = [du]
             else:
-                dus = []
-                for d in nb_dus:
-                    du = self.fungus.dispersal_unit()
-                    dus.append(du)
-                deposits[vid] = dus
+                deposits[vid] = self.fungus.dispersal_units(nb_dus)
         return deposits
             
     def view_distri_layers(self, g, density_dispersal_units = 1000., 
@@ -87,10 +87,12 @@ def infect(g, dt,
 
     for vid, du in dispersal_units.iteritems():
         # By leaf element, keep only those which are deposited and active
-        leaf = g.node(vid)
-        dispersal_units[vid] = [d for d in du if d.is_active]
-        for du in dispersal_units[vid]:
-            du.infect(dt, leaf)
+        active_dus = [d for d in du if d.is_active]
+        dispersal_units[vid] = active_dus
+        if len(active_dus)>0:
+            leaf = g.node(vid)
+            for du in active_dus:
+                du.infect(dt, leaf)
     return g
     
 def update(g, dt,
@@ -119,12 +121,14 @@ def update(g, dt,
     lesions = g.property('lesions')
     # 1. Compute growth demand
     for vid, les in lesions.iteritems():
-        for lesion in lesions[vid]:
-            if lesion.is_active:
-                leaf=g.node(vid)
-                if weather_data is None:
+        active_lesions = [l for l in les if l.is_active]
+        if len(active_lesions)>0:
+            leaf = g.node(vid)
+            if weather_data is None:
+                for lesion in active_lesions:
                     lesion.update(dt, leaf)
-                else:
+            else:
+                for lesion in active_lesions:
                     lesion.update(dt, leaf, weather_data)
     
     # 2. Allocate or not growth demand
@@ -1,17 +1,18 @@
 """
 Main steps to run a simulation of brown rust epidemics
 """
+from __future__ import print_function
 # General imports
 import pandas as pd
+import numpy as np
 import random as rd
-import sys
 from openalea.deploy.shared_data import shared_data
 
 # Imports for wheat
 from alinea.alep.simulation_tools.simulation_tools import (wheat_path, 
                                                            init_canopy, 
                                                            grow_canopy,
-                                                           alep_echap_reconstructions,
+                                                           cached_echap_reconstructions,
                                                            alep_custom_reconstructions,
                                                            get_iter_rep_wheats,
                                                            get_filename)
@@ -52,7 +53,8 @@ def setup_simu(sowing_date="2000-10-15 12:00:00", start_date = None,
     # Set canopy
     it_wheat = 0
     if variety!='Custom':
-        reconst = alep_echap_reconstructions(keep_leaves=keep_leaves, leaf_duration=leaf_duration)
+        reconst = cached_echap_reconstructions(keep_leaves=keep_leaves, 
+                                               leaf_duration=leaf_duration)
         adel = reconst.get_reconstruction(name=variety, nplants=nplants, nsect=nsect)
         if save_images:
             adel.stand.density_curve=None
@@ -75,8 +77,6 @@ def setup_simu(sowing_date="2000-10-15 12:00:00", start_date = None,
     rust_timing = CustomIterWithDelays(*time_control(seq, rust_filter, weather.data), eval_time='end')
     
     # Set up models
-    if 'alinea.alep.brown_rust' in sys.modules:
-        del (sys.modules['alinea.alep.brown_rust'])
     fungus = BrownRustFungus()
     fungus.parameters(**kwds)
     if record==True:
@@ -103,8 +103,15 @@ def annual_loop_rust(year = 2013, variety = 'Tremie13',
                      density_dispersal_units = 150, TT_delay=20,
                      record = True, output_file = None, layer_thickness=1.,
                      save_images = False, keep_leaves=False, 
-                     rep_wheat = True, leaf_duration=2., **kwds):
-    """ Simulate an epidemics over the campaign. """
+                     rep_wheat = True, leaf_duration=2., seed=None, **kwds):
+    """ Simulate an epidemics over the campaign. 
+    
+    If 'seed' is given, random generators are seeded so that the simulation
+    is reproducible.
+    """
+    if seed is not None:
+        np.random.seed(seed)
+        rd.seed(seed)
     # Setup simu
     (g, adel, fungus, canopy_timing, dispersal_timing, rust_timing, 
      recorder, growth_controler, infection_controler, 
@@ -123,6 +130,9 @@ def annual_loop_rust(year = 2013, variety = 'Tremie13',
                                      dispersal_timing, 
                                      rust_timing)):
         canopy_iter, dispersal_iter, rust_iter = controls
+        # Nothing to do until next event
+        if not (canopy_iter or dispersal_iter or rust_iter):
+            continue
         # Grow wheat canopy
         if canopy_iter:
             it_wheat += 1
@@ -130,12 +140,14 @@ def annual_loop_rust(year = 2013, variety = 'Tremie13',
                         wheat_dir, wheat_is_loaded)
         # Get weather for date and add it as properties on leaves
         if rust_iter:
+            rust_weather = rust_iter.value
             set_properties(g,label = 'LeafElement',
-                           temperature_sequence = rust_iter.value.temperature_air.tolist(),
-                           wetness_sequence = rust_iter.value.wetness.tolist(),
-                           dd_sequence = rust_iter.value.degree_days.tolist())
+                           temperature_sequence = rust_weather['temperature_air'].values.tolist(),
+                           wetness_sequence = rust_weather['wetness'].values.tolist(),
+                           dd_sequence = rust_weather['degree_days'].values.tolist())
         # Simulate airborne contamination
-        geom = g.property('geometry')
+        if dispersal_iter:
+            geom = g.property('geometry')
         if dispersal_iter and len(geom)>0:
             external_contamination(g, contaminator, contaminator, 
                                    density_dispersal_units=density_dispersal_units,
@@ -171,10 +183,9 @@ def annual_loop_rust(year = 2013, variety = 'Tremie13',
         
         # Save outputs
         if rust_iter and record == True:
-            date = rust_iter.value.index[-1]
-            print date
+            date = rust_weather.index[-1]
             recorder.record(g, date, 
-                            degree_days = rust_iter.value.degree_days[-1])
+                            degree_days = rust_weather['degree_days'].values[-1])
    
     if record == True:
         recorder.post_treatment(variety=variety)
@@ -185,6 +196,41 @@ def annual_loop_rust(year = 2013, variety = 'Tremie13',
     else:
         return g
         
+def annual_loop_rust_helper(kwargs):
+    return annual_loop_rust(**kwargs)
+
+def annual_loop_rust_ensemble(scenarios, nb_cpu=None, seed=None):
+    """ Run independent simulations of 'annual_loop_rust' in parallel.
+    
+    Parameters
+    ----------
+    scenarios: list of dict
+        Keyword arguments of 'annual_loop_rust' for each simulation. Each
+        scenario should give its own 'output_file' so that results are saved
+        by the workers instead of sending back the whole MTG.
+    nb_cpu: int
+        Number of processes to use (default: number of cpus minus one)
+    seed: int
+        Scenarios without their own 'seed' are seeded with seed + index of 
+        the scenario, to get reproducible ensembles. If None, the base seed
+        is drawn from os.urandom, so that forked workers, which inherit the
+        random state of the parent, do not all simulate the same epidemic
+    """
+    from openalea.multiprocessing.parallel import pymap
+    from multiprocessing import cpu_count
+    if nb_cpu is None:
+        nb_cpu = max(1, cpu_count()-1)
+    scenarios = [dict(sc, record=True) for sc in scenarios]
+    if seed is None:
+        seed = rd.SystemRandom().randint(0, 2**32 - 1 - len(scenarios))
+    for i, sc in enumerate(scenarios):
+        if sc.get('seed') is None:
+            sc['seed'] = seed + i
+    for sc in scenarios:
+        if sc.get('output_file') is None:
+            raise ValueError('Each scenario must have an output_file')
+    pymap(annual_loop_rust_helper, scenarios, nb_cpu)
+
 def run_reps_rust(year = 2013, variety = 'Tremie13', 
                   nplants = 15, nsect = 7, sowing_date = '10-15',
                   density_dispersal_units = 150, 
@@ -301,7 +347,7 @@ def explore_scenarios(years = range(2000,2007), nplants=15, nreps=3,
                                     'scale_fallingRate':0.8}):
     parameters['reference']=1.
     for param in parameters:
-        kwds = {k:1. if k!=param else v for k,v in parameters.iteritems()}
+        kwds = {k:1. if k!=param else v for k,v in parameters.items()}
         scale_leafRate = 1.5*kwds.pop('scale_leafRate')
         for yr in years:
             run_reps_rust(year=yr, variety='Custom', sowing_date='10-29',
@@ -397,7 +443,7 @@ def plot_explore_scenarios(years = range(1999,2007), nplants=15, variable='max_s
                 proxys += [plt.Line2D((0,1),(0,0), color=color, 
                                       marker=marker, linestyle='None')]
 
-    str_ranked_years = [str(t[1]) for t in sorted({v:k for k,v in rank_years.iteritems()}.items())]    
+    str_ranked_years = [str(t[1]) for t in sorted({v:k for k,v in rank_years.items()}.items())]    
     axRef.set_xlim([-1, len(years)])
     axRef.set_ylim([0,1.8])
     if variable=='max_severity':
@@ -405,10 +451,10 @@ def plot_explore_scenarios(years = range(1999,2007), nplants=15, variable='max_s
     if ylims is not None:
         axSev.set_ylim(ylims)
     axRef.set_ylim([0,1.8])
-    axRef.set_xticks([-1] + range(len(years))+ [len(years)+1])
+    axRef.set_xticks([-1] + list(range(len(years))) + [len(years)+1])
     axRef.set_xticklabels(['']+str_ranked_years+[''], rotation=30)
     axSev.set_xlim([-1, len(years)])
-    axSev.set_xticks([-1] + range(len(years))+ [len(years)+1])
+    axSev.set_xticks([-1] + list(range(len(years))) + [len(years)+1])
     axSev.set_xticklabels(['']+str_ranked_years+[''], rotation=30)
     axRef.grid(alpha=0.5)
     axSev.grid(alpha=0.5)
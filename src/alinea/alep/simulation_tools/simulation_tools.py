@@ -3,6 +3,7 @@
 Main tools to run a simulation of disease epidemics on wheat
 """
 import os
+import shutil
 import pandas as pd
 import numpy as np
 import random as rd
@@ -22,6 +23,7 @@ from alinea.astk.Weather import Weather
 
 # Imports for disease
 from alinea.alep.disease_outputs import plot_by_leaf
+from alinea.alep.architecture import clear_blade_leaves_cache
 
 # Imports for wheat
 from alinea.adel.astk_interface import AdelWheat
@@ -114,6 +116,8 @@ def init_canopy(adel, wheat_dir, rain_and_light=True):
 
 def grow_canopy(g, adel, canopy_iter, it_wheat,
                 wheat_dir, wheat_is_loaded=True, rain_and_light=True):
+    # Leaf elements of blades change with the canopy
+    clear_blade_leaves_cache(g)
     if wheat_is_loaded:
         newg, TT = adel.load(it_wheat, dir=wheat_dir)
         move_properties(g, newg)
@@ -179,6 +183,20 @@ def alep_echap_reconstructions(keep_leaves=False, leaf_duration=2.,
     # Temp
     reconst.GL_fits['Tremie12'].GL_bolting = reconst.GL_fits['Tremie13'].GL_bolting   
     return reconst
+
+_echap_reconstructions = {}
+def cached_echap_reconstructions(keep_leaves=False, leaf_duration=2.,
+                                 single_nff=False, variability=True):
+    """ Get echap reconstructions, built only once for a given set of options.
+    
+    Reconstructions are read-only during simulations (each call to 
+    'get_reconstruction' creates a new AdelWheat), so they can be shared
+    between successive simulations of a same session.
+    """
+    key = (keep_leaves, leaf_duration, single_nff, variability)
+    if key not in _echap_reconstructions:
+        _echap_reconstructions[key] = alep_echap_reconstructions(*key)
+    return _echap_reconstructions[key]
     
 def alep_custom_reconstructions(variety='Tremie13', nplants=30, 
                                 sowing_density=250.,
@@ -296,7 +314,7 @@ def make_canopy(year = 2013, variety = 'Tremie13', sowing_date = '10-29',
                 nplants = 15, nsect = 7, nreps=10, fixed_rep=None, delay = 20.):
     """ Simulate and save canopy (prior to simulation). """    
     def make_canopy_one_rep(rep=0):
-        reconst = alep_echap_reconstructions()
+        reconst = cached_echap_reconstructions()
         adel = reconst.get_reconstruction(name=variety, nplants=nplants, nsect=nsect)    
         domain = adel.domain
         convUnit = adel.convUnit
@@ -304,13 +322,24 @@ def make_canopy(year = 2013, variety = 'Tremie13', sowing_date = '10-29',
         rain_and_light_star(g, light_sectors = '1', domain = domain, convUnit = convUnit)
         it_wheat = 0
         wheat_dir = wheat_path(year, variety, nplants, nsect, rep)
-        adel.save(g, it_wheat, dir=wheat_dir)
+        # Save in temporary directory, so that simulations running in 
+        # parallel (see init_canopy) never load an incomplete canopy.
+        # Its name must not be counted by count_available_canopies.
+        tmp_dir = os.path.join(os.path.dirname(wheat_dir), 
+                               '.tmp_' + os.path.basename(wheat_dir))
+        # Discard iterations left by an interrupted run
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        adel.save(g, it_wheat, dir=tmp_dir)
         for i, canopy_iter in enumerate(canopy_timing):
             if canopy_iter:
                 it_wheat += 1
                 g = adel.grow(g, canopy_iter.value)
                 rain_and_light_star(g, light_sectors = '1', domain=domain, convUnit=convUnit)
-                adel.save(g, it_wheat, dir=wheat_dir)
+                adel.save(g, it_wheat, dir=tmp_dir)
+        # Overwrite any previous canopy (not atomic: do not regenerate a
+        # canopy while simulations are loading it)
+        shutil.rmtree(wheat_dir, ignore_errors=True)
+        os.rename(tmp_dir, wheat_dir)
                 
     # Manage weather and scheduling
     start_date=str(year-1)+"-"+sowing_date+" 12:00:00"
@@ -406,6 +435,7 @@ def add_leaf_dates_to_data(df, correct_leaf_number=True, force_mean_fnl=False):
 
 # Tools for disease ###########################################################
 from collections import defaultdict
+from itertools import chain
 def group_duplicates_in_cohort(g):
     def _get_index_duplicates(seq):
         dd = defaultdict(list)
@@ -422,11 +452,13 @@ def group_duplicates_in_cohort(g):
         for f in fungi:
             les_f = [l for l in les if l.fungus.name.startswith(f)]
             new_l = les_f[0].fungus.lesion()
-            new_l.position = sum([l.position for l in les_f], [])
+            new_l.position = list(chain.from_iterable(l.position for l in les_f))
         return new_l
     
     lesions = g.property('lesions')
     for vid, les in lesions.iteritems():
+        if len(les)<2:
+            continue
         ages = [l.age_tt for l in les]
         if len(les)!=len(set(ages)):
             idxs = _get_index_duplicates(ages)
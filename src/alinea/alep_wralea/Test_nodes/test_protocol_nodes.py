@@ -14,7 +14,7 @@ def wheat(wheat_model='adel_mtg2'):
     g: MTG
         Wheat MTG with properties
     """
-    return eval(wheat_model + '()')
+    return globals()[wheat_model]()
     
 # Climate #############################################################
 from alinea.weather.global_weather import Weather
@@ -0,0 +1,45 @@
+""" Tests for the recorders of disease outputs on wheat leaves.
+"""
+from alinea.adel.astk_interface import AdelWheat
+from alinea.alep.disease_outputs import (AdelSeptoRecorder, 
+                                         BrownRustRecorder, 
+                                         SeptoRustRecorder)
+import pandas as pd
+
+def get_small_g():
+    adel = AdelWheat(nplants = 1, nsect = 1)
+    g = adel.setup_canopy(age = 1000.)
+    return g
+
+def check_recorder(recorder, g):
+    """ Record g at two dates and check the recorded dataframe """
+    dates = pd.date_range('2014-03-01', periods = 2, freq = 'D')
+    for i, date in enumerate(dates):
+        recorder.record(g, date, degree_days = 100. * (i + 1))
+    nb_lines = recorder.nb_lines
+    # Column buffers must have grown past their initial size
+    assert nb_lines > recorder.increment
+    assert len(recorder.data_columns['date']) >= nb_lines
+    
+    df = recorder.to_frame()
+    assert len(df) == nb_lines
+    assert list(df.columns) == recorder.columns
+    assert set(df['degree_days']) == set([100., 200.])
+    assert all(df['date'].notnull())
+    assert len(df[df['degree_days'] == 100.]) == nb_lines / 2
+    # Data can be read during simulation
+    assert len(recorder.data) == nb_lines
+    
+    recorder.post_treatment()
+    assert recorder.data_columns is None
+    assert len(recorder.data) == nb_lines
+    assert 'num_leaf_top' in recorder.data.columns
+
+def test_septo_recorder():
+    check_recorder(AdelSeptoRecorder(increment = 3), get_small_g())
+
+def test_brown_rust_recorder():
+    check_recorder(BrownRustRecorder(increment = 3), get_small_g())
+
+def test_septo_rust_recorder():
+    check_recorder(SeptoRustRecorder(increment = 3), get_small_g())
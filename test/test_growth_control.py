@@ -0,0 +1,128 @@
+""" Regression tests for the models of competition between lesions for leaf area.
+"""
+from math import exp
+from alinea.alep.growth_control import (NoPriorityGrowthControl, 
+                                        PriorityGrowthControl,
+                                        GeometricPoissonCompetition,
+                                        SeptoRustCompetition)
+
+# Stubs ###########################################################################
+class StubMTG(object):
+    """ Two blades: blade 1 with leaf elements 2 and 3, blade 4 with leaf 
+        element 5. Each leaf element is 5 cm long and 5 cm2 large. """
+    def __init__(self, lesions, green_area=5.):
+        labels = {1:'blade', 2:'LeafElement1', 3:'LeafElement2', 
+                  4:'blade', 5:'LeafElement1'}
+        leaf_elements = [2, 3, 5]
+        self._components = {1:[2, 3], 4:[5]}
+        self._properties = {
+            'label': labels,
+            'geometry': {vid:'geometry' for vid in leaf_elements},
+            'area': {vid:5. for vid in leaf_elements},
+            'green_area': {vid:green_area for vid in leaf_elements},
+            'senesced_area': {vid:5.-green_area for vid in leaf_elements},
+            'length': {vid:5. for vid in leaf_elements},
+            'senesced_length': {vid:0. for vid in leaf_elements},
+            'lesions': lesions}
+        
+    def property(self, name):
+        return self._properties.setdefault(name, {})
+        
+    def components(self, vid):
+        return self._components.get(vid, [])
+
+class StubFungus(object):
+    CHLOROTIC = 2
+    def __init__(self, name='septoria'):
+        self.name = name
+
+class StubLesion(object):
+    def __init__(self, growth_demand=1., surface=1., status=2, 
+                 fungus=None, nb_lesions_non_sen=1, potential_surface=2.):
+        self.fungus = fungus if fungus is not None else StubFungus()
+        self.status = status
+        self.growth_demand = growth_demand
+        self.surface = surface
+        self.surface_alive = surface
+        self.surface_non_senescent = surface
+        self.potential_surface = potential_surface
+        self.nb_lesions_non_sen = nb_lesions_non_sen
+        self.growth_offer = None
+        self.senesced_length = None
+        
+    def control_growth(self, growth_offer=0.):
+        self.growth_offer = growth_offer
+        
+    def senescence_response(self, senesced_length=0.):
+        self.senesced_length = senesced_length
+
+def is_close(a, b):
+    return abs(a - b) < 1e-10
+
+# Tests ###########################################################################
+def test_no_priority_full_demand():
+    l1 = StubLesion(growth_demand=1.)
+    l2 = StubLesion(growth_demand=2.)
+    g = StubMTG({2:[l1], 3:[l2], 5:[]})
+    NoPriorityGrowthControl().control(g)
+    assert l1.growth_offer == 1.
+    assert l2.growth_offer == 2.
+
+def test_no_priority_shared_healthy_area():
+    # Healthy area: 10 - 2 = 8, shared in proportion of demands
+    l1 = StubLesion(growth_demand=10.)
+    l2 = StubLesion(growth_demand=2.)
+    g = StubMTG({2:[l1], 3:[l2]})
+    NoPriorityGrowthControl().control(g)
+    assert is_close(l1.growth_offer, 8. * 10. / 12.)
+    assert is_close(l2.growth_offer, 8. * 2. / 12.)
+
+def test_priority_to_chlorotic_lesions():
+    prior = StubLesion(growth_demand=6., status=2)
+    non_prior = StubLesion(growth_demand=6., status=1)
+    g = StubMTG({2:[prior], 3:[non_prior]})
+    PriorityGrowthControl().control(g)
+    assert is_close(prior.growth_offer, 6.)
+    assert is_close(non_prior.growth_offer, 2.)
+    
+    prior = StubLesion(growth_demand=10., status=2)
+    non_prior = StubLesion(growth_demand=6., status=1)
+    g = StubMTG({2:[prior], 3:[non_prior]})
+    PriorityGrowthControl().control(g)
+    assert is_close(prior.growth_offer, 8.)
+    assert non_prior.growth_offer == 0.
+
+def test_geometric_poisson_congestion():
+    l1 = StubLesion()
+    l2 = StubLesion()
+    g = StubMTG({2:[l1], 3:[l2]})
+    GeometricPoissonCompetition().control(g)
+    # 2 lesions of mean potential surface 2. on 10 cm2 of green area
+    offer = 10. * (1 - exp(-2 * 2. / 10.)) - 2.
+    assert is_close(l1.growth_offer, offer / 2.)
+    assert is_close(l2.growth_offer, offer / 2.)
+
+def test_geometric_poisson_senescence_border():
+    # Lesions cover more than the green area: senescence moves back 
+    # so that half of the blade length remains green
+    l1 = StubLesion()
+    l2 = StubLesion()
+    g = StubMTG({2:[l1], 3:[l2]}, green_area=0.5)
+    GeometricPoissonCompetition().control(g)
+    senesced_lengths = g.property('senesced_length')
+    assert senesced_lengths[2] == 0.
+    assert senesced_lengths[3] == 5.
+    assert l1.senesced_length == 0.
+    assert l2.senesced_length == 5.
+    assert l1.growth_offer == 0.
+    assert l2.growth_offer == 0.
+
+def test_septo_rust_competition():
+    septo = StubLesion(fungus=StubFungus('septoria'), status=2)
+    rust = StubLesion(fungus=StubFungus('brown_rust'))
+    g = StubMTG({2:[septo], 3:[rust]})
+    SeptoRustCompetition().control(g)
+    true_area_septo = 10. * (1 - exp(-2. / 10.))
+    true_area_all = 10. * (1 - exp(-2 * 2. / 10.))
+    assert is_close(septo.growth_offer, true_area_septo - 1.)
+    assert is_close(rust.growth_offer, true_area_all - 1. - true_area_septo)